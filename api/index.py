@@ -1,3 +1,2 @@
-from app.app import create_app
-
-app = create_app()
+# Reuse the app built when app.app is imported instead of creating a second one
+from app.app import app
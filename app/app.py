@@ -1,10 +1,12 @@
 from flask import Flask
 from flask_cors import CORS
-from flask_limiter import Limiter
-from flask_limiter.util import get_remote_address
 from flask_talisman import Talisman
+from werkzeug.middleware.proxy_fix import ProxyFix
 from app.config import Config
 from app.extensions.firebase import init_firebase
+from app.extensions.log import setup_logging
+from app.extensions.limiter import limiter
+from app.extensions.metrics import init_metrics
 from app.routes.vault_routes import vault_bp
 from app.routes.auth_routes import auth_bp
 
@@ -14,9 +16,18 @@ def create_app(config_class=Config):
 
 
 
+    # Structured logging first, so init messages go through it too
+    setup_logging(app)
+
+    # Fail at startup, not on the first passkey ceremony
+    if app.config.get('CHALLENGE_STORE') == 'redis' and not app.config.get('CHALLENGE_STORE_URL'):
+        raise ValueError("CHALLENGE_STORE=redis requires CHALLENGE_STORE_URL")
+
     # Initialize Extensions
-    # CRITICAL: Firebase must be initialized early for FirestoreClient to work
-    init_firebase(app)
+    # CRITICAL: Firebase must be initialized before FirestoreClient is used.
+    # With LAZY_INIT (serverless) that happens on the first request that needs it.
+    if not app.config.get('LAZY_INIT'):
+        init_firebase(app)
 
     # Security Extensions
     # CORS: Allow all since we are behind a proxy (Same-Origin)
@@ -24,17 +35,19 @@ def create_app(config_class=Config):
         r"/*": {
             "origins": "*",
             "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS", "PATCH"],
-            "allow_headers": ["Content-Type", "Authorization", "X-Requested-With", "Accept", "Origin"]
+            "allow_headers": ["Content-Type", "Authorization", "X-Requested-With", "Accept", "Origin", "If-Match", "If-None-Match"],
+            "expose_headers": ["X-Next-Page-Token", "ETag"]
         }
     })
 
-    # Rate Limiting
-    Limiter(
-        get_remote_address,
-        app=app,
-        default_limits=["2000 per day", "500 per hour"],
-        storage_uri="memory://"
-    )
+    # Behind Render/Vercel the socket peer is the proxy; take the client IP from
+    # X-Forwarded-For so rate limits are per user, not one bucket for everyone
+    hops = app.config.get('PROXY_FIX_X_FOR', 0)
+    if hops:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=hops, x_proto=hops)
+
+    # Rate Limiting (storage from RATELIMIT_STORAGE_URI, see app/extensions/limiter.py)
+    limiter.init_app(app)
 
 
 
@@ -48,10 +61,25 @@ def create_app(config_class=Config):
         force_https=False,  # Render's proxy handles this; enabling causes redirect loops
     )
 
+    # Latency histograms, Server-Timing header and /metrics
+    init_metrics(app)
+
     # Register Blueprints
     app.register_blueprint(vault_bp, url_prefix='/api/vault')
     app.register_blueprint(auth_bp, url_prefix='/api/auth')
 
+    @app.cli.command('cleanup-challenges')
+    def cleanup_challenges():
+        """Delete expired WebAuthn challenges from Firestore."""
+        from app.extensions.firestore import cleanup_expired_challenges
+        print(f"Deleted {cleanup_expired_challenges()} expired challenges")
+
+    @app.cli.command('backfill-vault-domains')
+    def backfill_vault_domains():
+        """Add the autofill lookup 'domain' field to existing vault entries."""
+        from app.extensions.firestore import backfill_vault_domains
+        print(f"Updated {backfill_vault_domains()} vault entries")
+
     @app.route('/health')
     @app.route('/api/health')
     def health_check():
@@ -25,3 +25,106 @@ class Config:
     # Origin for CORS and WebAuthn verification
     # This should be the full URL of the frontend (e.g. https://my-app.vercel.app)
     ORIGIN = os.environ.get('ORIGIN', 'http://localhost:5173')
+
+    # ID Token Verification
+    # 'local' verifies the JWT signature in-process using Google's cached public keys.
+    # 'rest' calls the Identity Toolkit accounts:lookup endpoint on every request.
+    FIREBASE_TOKEN_VERIFICATION = os.environ.get('FIREBASE_TOKEN_VERIFICATION', 'local')
+    # If Google's signing keys cannot be fetched, fall back to the REST lookup
+    FIREBASE_TOKEN_REST_FALLBACK = os.environ.get('FIREBASE_TOKEN_REST_FALLBACK', 'true').lower() == 'true'
+    # 'local' only checks signature and claims, so a disabled user or revoked session keeps
+    # working until the ID token expires (<= 1 hour). Set to also confirm each token with
+    # Identity Toolkit; with the token cache on that is one lookup per token, not per request.
+    FIREBASE_TOKEN_CHECK_REVOKED = os.environ.get('FIREBASE_TOKEN_CHECK_REVOKED', 'false').lower() == 'true'
+
+    # Verified Token Cache
+    # Skips re-verifying the same ID token on every request. Entries expire at the
+    # token's exp or after TOKEN_CACHE_MAX_TTL seconds, whichever comes first.
+    TOKEN_CACHE_ENABLED = os.environ.get('TOKEN_CACHE_ENABLED', 'true').lower() == 'true'
+    TOKEN_CACHE_MAX_SIZE = int(os.environ.get('TOKEN_CACHE_MAX_SIZE', 10000))
+    TOKEN_CACHE_MAX_TTL = int(os.environ.get('TOKEN_CACHE_MAX_TTL', 300))
+    # Optional redis:// URL so all gunicorn workers share one cache (requires the 'redis' package)
+    TOKEN_CACHE_URL = os.environ.get('TOKEN_CACHE_URL')
+
+    # Outbound HTTP (Firestore / Identity Toolkit REST)
+    # A single pooled keep-alive session is shared per worker process.
+    HTTP_CLIENT_POOL_CONNECTIONS = int(os.environ.get('HTTP_CLIENT_POOL_CONNECTIONS', 4))
+    HTTP_CLIENT_POOL_SIZE = int(os.environ.get('HTTP_CLIENT_POOL_SIZE', 20))
+    HTTP_CLIENT_CONNECT_TIMEOUT = float(os.environ.get('HTTP_CLIENT_CONNECT_TIMEOUT', 3.05))
+    HTTP_CLIENT_READ_TIMEOUT = float(os.environ.get('HTTP_CLIENT_READ_TIMEOUT', 10))
+    # Retries with exponential backoff on 429/503 (idempotent calls only)
+    HTTP_CLIENT_MAX_RETRIES = int(os.environ.get('HTTP_CLIENT_MAX_RETRIES', 2))
+    HTTP_CLIENT_BACKOFF_FACTOR = float(os.environ.get('HTTP_CLIENT_BACKOFF_FACTOR', 0.2))
+    # Upper bound on the total time one request spends sleeping between retries
+    HTTP_CLIENT_MAX_RETRY_SLEEP = float(os.environ.get('HTTP_CLIENT_MAX_RETRY_SLEEP', 2.0))
+    # Use an HTTP/2 transport (requires 'httpx[http2]')
+    HTTP_CLIENT_HTTP2 = os.environ.get('HTTP_CLIENT_HTTP2', 'false').lower() == 'true'
+
+    # WebAuthn Challenge Store
+    # 'memory'    - in-process, fastest; only safe with a single worker/instance
+    # 'redis'     - shared across workers/instances (requires the 'redis' package)
+    # 'firestore' - webauthn_challenges collection (default, works everywhere)
+    CHALLENGE_STORE = os.environ.get('CHALLENGE_STORE', 'firestore')
+    CHALLENGE_STORE_URL = os.environ.get('CHALLENGE_STORE_URL')
+
+    # Persist passkey sign counts from a background write-behind queue instead of
+    # on the login request path. Off by default on Vercel: frozen instances never
+    # run the background thread or atexit, so queued counts would be lost.
+    SIGN_COUNT_WRITE_BEHIND = os.environ.get('SIGN_COUNT_WRITE_BEHIND', 'false' if os.environ.get('VERCEL') else 'true').lower() == 'true'
+
+    # Extra gRPC channel options for the Firestore Admin client, comma separated
+    # e.g. "grpc.keepalive_time_ms=30000,grpc.max_receive_message_length=8388608"
+    FIRESTORE_GRPC_OPTIONS = os.environ.get('FIRESTORE_GRPC_OPTIONS')
+
+    # Hand back the same custom token for repeat passkey logins by one uid within
+    # this many seconds (0 = always mint a new one). Tokens are valid for an hour.
+    CUSTOM_TOKEN_REUSE_SECONDS = int(os.environ.get('CUSTOM_TOKEN_REUSE_SECONDS', 0))
+
+    # 2FA State Cache
+    # twoFactorEnabled/twoFactorSecret are cached per user for this many seconds
+    # (0 disables). Set TWO_FACTOR_CACHE_URL (redis://) so enable/disable in one
+    # worker invalidates the others immediately instead of after the TTL.
+    TWO_FACTOR_CACHE_TTL = int(os.environ.get('TWO_FACTOR_CACHE_TTL', 60))
+    TWO_FACTOR_CACHE_URL = os.environ.get('TWO_FACTOR_CACHE_URL')
+
+    # Optional redis:// URL so used TOTP codes are tracked across all workers
+    # (otherwise replay protection is per process)
+    TOTP_REPLAY_URL = os.environ.get('TOTP_REPLAY_URL')
+
+    # Rate Limiting
+    # memory:// counts per worker; use sqlite:///path (all workers on one host)
+    # or redis://host:port (all hosts) so limits hold when scaled out.
+    RATELIMIT_STORAGE_URI = os.environ.get('RATELIMIT_STORAGE_URI', 'memory://')
+    # Proxies in front of the app (Render/Vercel: 1). Rate limits key on the client IP,
+    # which is only trustworthy from this many X-Forwarded-For hops; 0 disables ProxyFix.
+    PROXY_FIX_X_FOR = int(os.environ.get('PROXY_FIX_X_FOR', 1))
+    # Per-route limits for the expensive endpoints
+    RATELIMIT_VAULT_LIST = os.environ.get('RATELIMIT_VAULT_LIST', '120 per minute')
+    RATELIMIT_AUTH_VERIFY = os.environ.get('RATELIMIT_AUTH_VERIFY', '10 per minute')
+
+    # Upstream REST endpoints. Override to point at the Firestore emulator or the
+    # local stub in benchmarks/stub_server.py.
+    FIRESTORE_BASE_URL = os.environ.get('FIRESTORE_BASE_URL') or (
+        f"http://{os.environ['FIRESTORE_EMULATOR_HOST']}" if os.environ.get('FIRESTORE_EMULATOR_HOST')
+        else 'https://firestore.googleapis.com'
+    )
+    IDENTITY_TOOLKIT_BASE_URL = os.environ.get('IDENTITY_TOOLKIT_BASE_URL', 'https://identitytoolkit.googleapis.com')
+
+    # Instrumentation
+    # Adds a Server-Timing header (auth, firestore, serialize, ... in ms) to every response.
+    # It exposes backend timings to any client, so keep it off in production.
+    SERVER_TIMING_ENABLED = os.environ.get('SERVER_TIMING_ENABLED', 'false').lower() == 'true'
+    # /metrics answers 404 unless this is set; scrapers send "Authorization: Bearer <METRICS_TOKEN>"
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
+    # Logging
+    # Records are queued and written as JSON lines by a background thread
+    LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+    LOG_FORMAT = os.environ.get('LOG_FORMAT', 'json')  # 'json' or 'text'
+    # Fraction of DEBUG records kept (per-request debug events are high volume)
+    LOG_DEBUG_SAMPLE_RATE = float(os.environ.get('LOG_DEBUG_SAMPLE_RATE', '0.1'))
+
+    # Cold start
+    # Defer Admin SDK init (credential parsing, firebase_admin import) to the first
+    # request that needs it. On by default on Vercel, where every cold start counts.
+    LAZY_INIT = os.environ.get('LAZY_INIT', 'true' if os.environ.get('VERCEL') else 'false').lower() == 'true'
@@ -1,16 +1,55 @@
 from flask import request, jsonify, current_app
 import pyotp
-import requests
+from app.extensions import http_client
 from app.extensions.firebase import get_firestore_base_url
+from app.extensions.log import get_logger
+from app.services.two_factor_cache import get_two_factor_cache
+from app.services.totp_engine import get_totp_engine
 from datetime import datetime
 
+log = get_logger(__name__)
+
 # Firestore Helpers
-def get_user_doc(uid, token):
+def get_user_doc(uid, token, fields=None):
     url = f"{get_firestore_base_url()}/users/{uid}"
     headers = {"Authorization": f"Bearer {token}"}
-    response = requests.get(url, headers=headers, timeout=10)
+    # Only fetch the fields we need (mask.fieldPaths)
+    params = {'mask.fieldPaths': fields} if fields else None
+    response = http_client.get(url, headers=headers, params=params)
     return response
 
+def get_2fa_state(uid, token, fresh=False):
+    """
+    Return ({'enabled', 'secret'}, None) or (None, response) on Firestore failure.
+    Served from the per-user cache when possible, unless fresh is set.
+    """
+    cache = get_two_factor_cache(current_app.config)
+    state = None if fresh else cache.get(uid)
+    if state is not None:
+        return state, None
+
+    response = get_user_doc(uid, token, fields=['twoFactorEnabled', 'twoFactorSecret'])
+
+    # If user doc doesn't exist yet, it's fine, 2FA is false
+    if response.status_code == 404:
+        state = {'enabled': False, 'secret': None}
+    elif response.status_code != 200:
+        return None, response
+    else:
+        fields = response.json().get('fields', {})
+        state = {
+            'enabled': fields.get('twoFactorEnabled', {}).get('booleanValue', False),
+            'secret': fields.get('twoFactorSecret', {}).get('stringValue'),
+        }
+
+    cache.set(uid, state)
+    return state, None
+
+def _is_totp_code(code):
+    # 6-8 ASCII digits; anything else (e.g. full-width digits) is a client error, not a 500
+    code = str(code).strip()
+    return code.isascii() and code.isdigit() and 6 <= len(code) <= 8
+
 def update_user_doc(uid, token, fields):
     url = f"{get_firestore_base_url()}/users/{uid}?updateMask.fieldPaths=twoFactorSecret&updateMask.fieldPaths=twoFactorEnabled"
     headers = {"Authorization": f"Bearer {token}"}
@@ -19,7 +58,7 @@ def update_user_doc(uid, token, fields):
     data = {"fields": fields}
     
     # We use PATCH to update specific fields
-    response = requests.patch(url, json=data, headers=headers, timeout=10)
+    response = http_client.patch(url, json=data, headers=headers)
     return response
 
 def generate_2fa_secret():
@@ -47,11 +86,12 @@ def enable_2fa():
     
     if not secret or not code:
         return jsonify({'error': 'Secret and code are required'}), 400
+    if not _is_totp_code(code):
+        return jsonify({'error': 'Invalid 2FA code format'}), 400
         
     # Verify the code against the secret BEFORE saving
-    totp = pyotp.TOTP(secret)
-    # Allow 1 step window (30s) for time drift
-    if not totp.verify(code, valid_window=1):
+    # Allow 1 step window (30s) for time drift; the code is then spent for this user
+    if not get_totp_engine(current_app.config).verify(uid, secret, code):
         return jsonify({'error': 'Invalid 2FA code'}), 400
         
     # Save to Firestore
@@ -60,7 +100,11 @@ def enable_2fa():
         "twoFactorEnabled": {"booleanValue": True}
     }
     
+    # Invalidate on both sides of the write so no reader caches the old state in between
+    cache = get_two_factor_cache(current_app.config)
+    cache.invalidate(uid)
     response = update_user_doc(uid, token, fields)
+    cache.invalidate(uid)
     
     if response.status_code != 200:
         return jsonify({'error': 'Failed to save 2FA status', 'details': response.text}), 500
@@ -77,7 +121,10 @@ def disable_2fa():
         "twoFactorSecret": {"stringValue": ""} 
     }
     
+    cache = get_two_factor_cache(current_app.config)
+    cache.invalidate(uid)
     response = update_user_doc(uid, token, fields)
+    cache.invalidate(uid)
     
     if response.status_code != 200:
         return jsonify({'error': 'Failed to disable 2FA', 'details': response.text}), 500
@@ -97,30 +144,36 @@ def verify_2fa_login():
     
     if not code:
         return jsonify({'error': 'Code is required'}), 400
+    if not _is_totp_code(code):
+        return jsonify({'error': 'Invalid 2FA code format'}), 400
         
     # Fetch User Secret
-    response = get_user_doc(uid, token)
-    if response.status_code != 200:
+    state, response = get_2fa_state(uid, token)
+    if state is None:
          return jsonify({'error': 'Failed to fetch user profile'}), 500
          
-    user_data = response.json()
-    fields = user_data.get('fields', {})
-    
-    enabled = fields.get('twoFactorEnabled', {}).get('booleanValue', False)
+    enabled = state['enabled']
     
     # If not enabled, verification is trivially true (or we can say "not enabled")
     # But usually this endpoint is called ONLY if enabled.
     if not enabled:
         return jsonify({'message': '2FA is not enabled'}), 200
         
-    secret = fields.get('twoFactorSecret', {}).get('stringValue')
+    secret = state['secret']
     if not secret:
         return jsonify({'error': '2FA is enabled but no secret found'}), 500
         
-    totp = pyotp.TOTP(secret)
-    # Allow 1 step window (30s) for time drift
-    if not totp.verify(code, valid_window=1):
-        return jsonify({'error': 'Invalid 2FA code'}), 401
+    # Allow 1 step window (30s) for time drift; a code can't be replayed
+    engine = get_totp_engine(current_app.config)
+    if not engine.verify(uid, secret, code):
+        # The cached secret may predate a re-enable in another worker; check the stored one
+        state, response = get_2fa_state(uid, token, fresh=True)
+        if state is None:
+            return jsonify({'error': 'Failed to fetch user profile'}), 500
+        if not state['enabled']:
+            return jsonify({'message': '2FA is not enabled'}), 200
+        if not state['secret'] or state['secret'] == secret or not engine.verify(uid, state['secret'], code):
+            return jsonify({'error': 'Invalid 2FA code'}), 401
         
     return jsonify({'message': 'verified'}), 200
 
@@ -128,28 +181,21 @@ def get_2fa_status():
     uid = request.uid
     token = request.token
     
-    response = get_user_doc(uid, token)
-    
-    # If user doc doesn't exist yet, it's fine, 2FA is false
-    if response.status_code == 404:
-        return jsonify({'enabled': False}), 200
+    state, response = get_2fa_state(uid, token)
         
-    if response.status_code != 200:
+    if state is None:
         return jsonify({'error': 'Failed to fetch status', 'details': response.text}), 500
-        
-    user_data = response.json()
-    fields = user_data.get('fields', {})
-    enabled = fields.get('twoFactorEnabled', {}).get('booleanValue', False)
     
-    return jsonify({'enabled': enabled}), 200
+    return jsonify({'enabled': state['enabled']}), 200
 
 # ==========================================
 # WEBAUTHN CONTROLLER METHODS
 # ==========================================
-
-from app.services.webauthn_service import WebAuthnService
+# The webauthn library and Admin SDK are imported on first use, not at startup
 
 def webauthn_register_options():
+    from app.services.webauthn_service import WebAuthnService
+    from app.extensions.challenge_store import ChallengeStoreUnavailable
     try:
         uid = request.uid
         # Fallback if email is missing (e.g. phone auth)
@@ -157,50 +203,57 @@ def webauthn_register_options():
         
         options = WebAuthnService.generate_registration_options(uid, email)
         return current_app.response_class(options, mimetype='application/json'), 200
+    except ChallengeStoreUnavailable:
+        return jsonify({'error': 'Passkey service temporarily unavailable'}), 503
     except Exception as e:
-        import sys
         import traceback
-        traceback.print_exc()
-        print(f"DEBUG ERROR: {str(e)}", file=sys.stderr)
-        current_app.logger.error(f"WebAuthn Options Error: {str(e)}")
+        log.exception("WebAuthn registration options failed")
         # Return 500 so we know it crashed, not just bad request
         return jsonify({'error': str(e), 'trace': traceback.format_exc()}), 500
 
 def webauthn_register_verify():
+    from app.services.webauthn_service import WebAuthnService
+    from app.extensions.challenge_store import ChallengeStoreUnavailable
     uid = request.uid
     token = request.token
     data = request.json
     
     try:
-        import sys
-        print(f"DEBUG: Verifying WebAuthn Registration for uid={uid}", file=sys.stderr)
+        log.debug("Verifying WebAuthn registration", extra={'fields': {'uid': uid}})
         result = WebAuthnService.verify_registration_response(uid, data, token)
         return jsonify(result), 200
+    except ChallengeStoreUnavailable:
+        return jsonify({'error': 'Passkey service temporarily unavailable'}), 503
     except Exception as e:
-        import sys
         import traceback
-        traceback.print_exc(file=sys.stderr)
-        print(f"DEBUG ERROR in webauthn_register_verify: {str(e)}", file=sys.stderr)
-        current_app.logger.error(f"WebAuthn Reg Error: {str(e)}")
+        log.exception("WebAuthn registration verification failed", extra={'fields': {'uid': uid}})
         return jsonify({'error': str(e), 'trace': traceback.format_exc()}), 500
 
 def webauthn_login_options():
+    from app.services.webauthn_service import WebAuthnService
+    from app.extensions.challenge_store import ChallengeStoreUnavailable
     try:
         data = request.json or {}
         email = data.get('email')
         uid = None
+        authenticated = bool(getattr(request, 'uid', None))
         
-        if getattr(request, 'uid', None):
+        if authenticated:
             uid = request.uid
         elif data.get('uid'):
             uid = data.get('uid')
         
-        options = WebAuthnService.generate_login_options(uid)
+        options = WebAuthnService.generate_login_options(uid, authenticated=authenticated)
         return current_app.response_class(options, mimetype='application/json'), 200
+    except ChallengeStoreUnavailable:
+        return jsonify({'error': 'Passkey service temporarily unavailable'}), 503
     except Exception as e:
         return jsonify({'error': str(e)}), 400
 
 def webauthn_login_verify():
+    from app.services.webauthn_service import WebAuthnService
+    from app.extensions.challenge_store import ChallengeStoreUnavailable
+    from app.services.token_minter import token_minter
     try:
         data = request.json
         uid = data.get('uid')
@@ -215,19 +268,17 @@ def webauthn_login_verify():
 
         result = WebAuthnService.verify_login_response(uid, data_for_service)
         
-        from firebase_admin import auth
-        custom_token = auth.create_custom_token(uid)
+        custom_token = token_minter.mint(uid)
         
         return jsonify({
             'verified': True,
-            'token': custom_token.decode('utf-8') if isinstance(custom_token, bytes) else custom_token,
+            'token': custom_token,
              'sign_count': result.get('new_sign_count')
         }), 200
         
+    except ChallengeStoreUnavailable:
+        return jsonify({'error': 'Passkey service temporarily unavailable'}), 503
     except Exception as e:
-        import sys
         import traceback
-        traceback.print_exc()
-        print(f"DEBUG ERROR in webauthn_login_verify: {str(e)}", file=sys.stderr)
-        current_app.logger.error(f"WebAuthn Login Error: {str(e)}")
+        log.exception("WebAuthn login verification failed")
         return jsonify({'error': str(e), 'trace': traceback.format_exc()}), 500
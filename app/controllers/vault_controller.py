@@ -1,8 +1,85 @@
-from flask import request, jsonify, current_app
-import requests
+from flask import request, jsonify, current_app, Response, stream_with_context
+from app.extensions import http_client
+import base64
+import hashlib
 import json
-from datetime import datetime
-from app.extensions.firebase import get_firestore_base_url
+from datetime import datetime, timezone
+import secrets
+import string
+from app.extensions.firebase import get_firestore_base_url, get_firestore_document_root
+from app.extensions.log import get_logger
+from app.services.vault_codec import VAULT_FIELDS, DOMAIN_FIELD, document_to_item, entry_write, server_timestamps, dumps, json_response
+from app.services.site_domain import registrable_domain
+
+log = get_logger(__name__)
+
+# Firestore caps list pages at this size
+MAX_PAGE_SIZE = 1000
+
+def _parse_field_mask():
+    """
+    Parse ?fields=site,username into a Firestore field mask.
+    Returns (mask, error); mask is None when all fields are wanted.
+    """
+    raw = request.args.get('fields')
+    if not raw:
+        return None, None
+    mask = [f.strip() for f in raw.split(',') if f.strip()]
+    unknown = [f for f in mask if f not in VAULT_FIELDS]
+    if unknown:
+        return None, f"Unknown fields: {', '.join(unknown)}"
+    return mask, None
+
+def _is_doc_id(value):
+    # A single path segment: anything with '/' would address a nested document
+    return isinstance(value, str) and bool(value) and '/' not in value
+
+def _mask_params(mask):
+    # Firestore only returns the listed fields; 'name' is always included
+    return {'mask.fieldPaths': mask} if mask else {}
+
+def _entry_etag(doc, mask=None):
+    # Firestore's updateTime changes on every write, so it makes a strong validator.
+    # Projections are different representations and get their own tag.
+    update_time = doc.get('updateTime', '')
+    return f"{update_time};fields={','.join(mask)}" if mask else update_time
+
+def _list_etag(versions, mask=None):
+    # Collection version: hash of every (name, updateTime) in the listing
+    digest = hashlib.sha256()
+    for version in versions:
+        digest.update(version.encode('utf-8'))
+        digest.update(b'\n')
+    if mask:
+        digest.update(','.join(mask).encode('utf-8'))
+    return digest.hexdigest()[:32]
+
+def _conditional_response(body, etag):
+    # Answers If-None-Match with 304 Not Modified
+    resp, _ = json_response(body)
+    resp.set_etag(etag)
+    return resp.make_conditional(request)
+
+def _if_match_precondition():
+    """
+    Map If-Match to a Firestore currentDocument precondition.
+    Returns (precondition, error); both are None when no If-Match was sent.
+    """
+    if not request.if_match:
+        return None, None
+    if request.if_match.star_tag:
+        return {'exists': True}, None
+    tags = request.if_match.as_set()
+    if len(tags) != 1:
+        return None, (jsonify({'error': 'If-Match must contain exactly one strong ETag'}), 400)
+    update_time = tags.pop().split(';', 1)[0]
+    return {'updateTime': update_time}, None
+
+def _firestore_error(response):
+    # A failed currentDocument precondition means the client's ETag is stale
+    if response.status_code in (400, 409) and 'FAILED_PRECONDITION' in response.text:
+        return jsonify({'error': 'Entry was modified', 'details': response.text}), 412
+    return jsonify({'error': 'Firestore Error', 'details': response.text}), response.status_code
 
 def add_password():
     uid = request.uid
@@ -13,52 +90,48 @@ def add_password():
     if not all(k in data for k in required_fields):
         return jsonify({'error': 'Missing required fields'}), 400
 
-    # Firestore REST API Endpoint for creating a document
-    # collection: users/{uid}/vault
-    url = f"{get_firestore_base_url()}/users/{uid}/vault"
+    # Created through :commit rather than POST .../vault, so createdAt/updatedAt
+    # can be set to the server's commit time (see server_timestamps)
+    url = f"{get_firestore_base_url()}:commit"
+    doc_id = _new_doc_id()
     
-    print(f"DEBUG: Processing request for UID: {uid}")
-    print(f"DEBUG: Using URL: {url}")
-    print(f"DEBUG: Token starts with: {token[:10]}...")
+    log.debug("Creating vault entry", extra={'fields': {'uid': uid, 'id': doc_id}})
     
     # Firestore REST format requires types (stringValue, etc.)
-    firestore_data = {
-        "fields": {
-            "site": {"stringValue": data['site']},
-            "username": {"stringValue": data['username']},
-            "encryptedPassword": {"stringValue": data['encryptedPassword']},
-            "iv": {"stringValue": data['iv']},
-            "createdAt": {"timestampValue": datetime.utcnow().isoformat() + "Z"},
-            "updatedAt": {"timestampValue": datetime.utcnow().isoformat() + "Z"}
-        }
-    }
+    write = entry_write(f"{get_firestore_document_root()}/users/{uid}/vault/{doc_id}", data, created=True)
+    # A (vanishingly unlikely) ID collision must not overwrite another entry
+    write["currentDocument"] = {"exists": False}
     
     # We pass the user's token so Firestore Security Rules apply!
     # This effectively makes the backend a proxy that enforces structure but respects the rules.
     headers = {"Authorization": f"Bearer {token}"}
     
-    response = requests.post(url, json=firestore_data, headers=headers)
+    response = http_client.post(url, json={"writes": [write]}, headers=headers)
     
     if response.status_code != 200:
-        print(f"Firestore Create Error: {response.status_code}")
-        print(response.text)
+        log.warning("Firestore create failed", extra={'fields': {'uid': uid, 'status': response.status_code}})
+        log.debug("Firestore create error body", extra={'fields': {'body': response.text}})
         return jsonify({'error': 'Firestore Error', 'details': response.text}), response.status_code
         
-    # Response contains the created document info
-    doc_info = response.json()
-    # Extract ID from "name": "projects/.../documents/users/uid/vault/DOC_ID"
-    doc_id = doc_info['name'].split('/')[-1]
+    # The write result carries the new document's updateTime
+    write_result = response.json()['writeResults'][0]
     
-    return jsonify({'id': doc_id, 'message': 'Password stored successfully'}), 201
+    resp = jsonify({'id': doc_id, 'message': 'Password stored successfully'})
+    resp.set_etag(_entry_etag(write_result))
+    return resp, 201
 
 def get_password(entry_id):
     uid = request.uid
     token = request.token
     
+    mask, error = _parse_field_mask()
+    if error:
+        return jsonify({'error': error}), 400
+
     url = f"{get_firestore_base_url()}/users/{uid}/vault/{entry_id}"
     headers = {"Authorization": f"Bearer {token}"}
     
-    response = requests.get(url, headers=headers)
+    response = http_client.get(url, headers=headers, params=_mask_params(mask))
     
     if response.status_code == 404:
         return jsonify({'error': 'Password entry not found'}), 404
@@ -67,60 +140,132 @@ def get_password(entry_id):
         return jsonify({'error': 'Firestore Error', 'details': response.text}), response.status_code
         
     doc = response.json()
-    fields = doc.get('fields', {})
-    
-    item = {
-        'id': doc['name'].split('/')[-1],
-        'site': fields.get('site', {}).get('stringValue', ''),
-        'username': fields.get('username', {}).get('stringValue', ''),
-        'encryptedPassword': fields.get('encryptedPassword', {}).get('stringValue', ''),
-        'iv': fields.get('iv', {}).get('stringValue', ''),
-    }
-            
-    return jsonify(item), 200
+    return _conditional_response(document_to_item(doc, mask), _entry_etag(doc, mask))
+
+def _list_vault_page(uid, token, page_size, page_token=None, order_by=None, mask=None):
+    url = f"{get_firestore_base_url()}/users/{uid}/vault"
+    headers = {"Authorization": f"Bearer {token}"}
+    params = {'pageSize': page_size, **_mask_params(mask)}
+    if page_token:
+        params['pageToken'] = page_token
+    if order_by:
+        params['orderBy'] = order_by
+    return http_client.get(url, headers=headers, params=params)
+
+def _stream_vault(uid, token, first_page, order_by, mask, fmt):
+    # Walk every page, emitting entries as soon as each page arrives
+    data = first_page
+    first = True
+    if fmt == 'json':
+        yield '['
+    while True:
+        for doc in data.get('documents', []):
+            line = dumps(document_to_item(doc, mask))
+            if fmt == 'json':
+                yield line if first else ',' + line
+            else:
+                yield line + '\n'
+            first = False
+
+        page_token = data.get('nextPageToken')
+        if not page_token:
+            break
+        response = _list_vault_page(uid, token, MAX_PAGE_SIZE, page_token, order_by, mask)
+        if response.status_code != 200:
+            # Headers are already sent, so make the truncation impossible to miss:
+            # ndjson ends with an error record, json is left without its closing ']'
+            log.warning("Firestore list failed while streaming", extra={'fields': {'uid': uid, 'status': response.status_code}})
+            if fmt == 'ndjson':
+                yield dumps({'error': 'Firestore Error', 'status': response.status_code, 'truncated': True}) + '\n'
+            return
+        data = response.json()
+    if fmt == 'json':
+        yield ']'
 
 def get_passwords():
     uid = request.uid
     token = request.token
-    
-    url = f"{get_firestore_base_url()}/users/{uid}/vault"
-    headers = {"Authorization": f"Bearer {token}"}
-    
-    response = requests.get(url, headers=headers)
-    
+
+    page_token = request.args.get('pageToken')
+    order_by = request.args.get('orderBy')
+    stream = request.args.get('stream')
+
+    page_size = request.args.get('pageSize')
+    if page_size is not None:
+        try:
+            page_size = int(page_size)
+        except ValueError:
+            return jsonify({'error': 'pageSize must be an integer'}), 400
+        if not 1 <= page_size <= MAX_PAGE_SIZE:
+            return jsonify({'error': f'pageSize must be between 1 and {MAX_PAGE_SIZE}'}), 400
+
+    if stream and stream not in ('ndjson', 'json'):
+        return jsonify({'error': "stream must be 'ndjson' or 'json'"}), 400
+
+    mask, error = _parse_field_mask()
+    if error:
+        return jsonify({'error': error}), 400
+
+    response = _list_vault_page(uid, token, page_size or MAX_PAGE_SIZE, page_token, order_by, mask)
+
     if response.status_code != 200:
-        print(f"Firestore List Error: {response.status_code}")
-        print(response.text)
+        log.warning("Firestore list failed", extra={'fields': {'uid': uid, 'status': response.status_code}})
+        log.debug("Firestore list error body", extra={'fields': {'body': response.text}})
         return jsonify({'error': 'Firestore Error', 'details': response.text}), response.status_code
-        
+
     data = response.json()
-    results = []
-    
-    if 'documents' in data:
-        for doc in data['documents']:
-            fields = doc.get('fields', {})
-            item = {
-                'id': doc['name'].split('/')[-1],
-                'site': fields.get('site', {}).get('stringValue', ''),
-                'username': fields.get('username', {}).get('stringValue', ''),
-                'encryptedPassword': fields.get('encryptedPassword', {}).get('stringValue', ''),
-                'iv': fields.get('iv', {}).get('stringValue', ''),
-            }
-            results.append(item)
-            
-    return jsonify(results), 200
+
+    if stream:
+        mimetype = 'application/x-ndjson' if stream == 'ndjson' else 'application/json'
+        return Response(stream_with_context(_stream_vault(uid, token, data, order_by, mask, stream)), mimetype=mimetype)
+
+    results = [document_to_item(doc, mask) for doc in data.get('documents', [])]
+    versions = [doc['name'] + doc.get('updateTime', '') for doc in data.get('documents', [])]
+
+    if page_size is not None:
+        # Cursor-based pagination: the client passes this back as pageToken
+        if data.get('nextPageToken'):
+            versions.append(data['nextPageToken'])
+        resp = _conditional_response(results, _list_etag(versions, mask))
+        if data.get('nextPageToken'):
+            resp.headers['X-Next-Page-Token'] = data['nextPageToken']
+        return resp
+
+    # No explicit page requested: return the whole vault, not just Firestore's first page
+    while data.get('nextPageToken'):
+        response = _list_vault_page(uid, token, MAX_PAGE_SIZE, data['nextPageToken'], order_by, mask)
+        if response.status_code != 200:
+            log.warning("Firestore list failed", extra={'fields': {'uid': uid, 'status': response.status_code}})
+            log.debug("Firestore list error body", extra={'fields': {'body': response.text}})
+            return jsonify({'error': 'Firestore Error', 'details': response.text}), response.status_code
+        data = response.json()
+        results.extend(document_to_item(doc, mask) for doc in data.get('documents', []))
+        versions.extend(doc['name'] + doc.get('updateTime', '') for doc in data.get('documents', []))
+
+    return _conditional_response(results, _list_etag(versions, mask))
 
 def delete_password(entry_id):
     uid = request.uid
     token = request.token
     
-    url = f"{get_firestore_base_url()}/users/{uid}/vault/{entry_id}"
+    precondition, error = _if_match_precondition()
+    if error:
+        return error
+
+    # Delete the entry and record a tombstone in one atomic commit,
+    # so /changes can tell other devices about the deletion
+    url = f"{get_firestore_base_url()}:commit"
     headers = {"Authorization": f"Bearer {token}"}
+    name = f"{get_firestore_document_root()}/users/{uid}/vault/{entry_id}"
+    delete_write = {"delete": name}
+    if precondition:
+        delete_write["currentDocument"] = precondition
+    writes = [delete_write, _tombstone_write(uid, entry_id)]
     
-    response = requests.delete(url, headers=headers)
+    response = http_client.post(url, json={"writes": writes}, headers=headers)
     
     if response.status_code != 200:
-        return jsonify({'error': 'Firestore Error', 'details': response.text}), response.status_code
+        return _firestore_error(response)
     
     return jsonify({'message': 'Password deleted'}), 200
 
@@ -133,30 +278,377 @@ def update_password(entry_id):
     if not all(k in data for k in required_fields):
         return jsonify({'error': 'Missing required fields'}), 400
 
-    url = f"{get_firestore_base_url()}/users/{uid}/vault/{entry_id}"
-    
-    # Firestore REST API for Patch/Update
-    # We use patch ensure we only update fields we want, though here we replace all main fields
-    firestore_data = {
-        "fields": {
-            "site": {"stringValue": data['site']},
-            "username": {"stringValue": data['username']},
-            "encryptedPassword": {"stringValue": data['encryptedPassword']},
-            "iv": {"stringValue": data['iv']},
-            "updatedAt": {"timestampValue": datetime.utcnow().isoformat() + "Z"}
-        }
-    }
+    precondition, error = _if_match_precondition()
+    if error:
+        return error
+
+    # Through :commit rather than PATCH, so updatedAt is the server's commit time
+    url = f"{get_firestore_base_url()}:commit"
+    write = entry_write(f"{get_firestore_document_root()}/users/{uid}/vault/{entry_id}", data)
+    # Overwrite the content fields; createdAt is left alone
+    write["updateMask"] = {"fieldPaths": list(VAULT_FIELDS) + [DOMAIN_FIELD]}
+    if precondition:
+        # e.g. currentDocument.updateTime=... so concurrent edits fail instead of overwriting
+        write["currentDocument"] = precondition
     
     headers = {"Authorization": f"Bearer {token}"}
     
-    # Using PATCH to update specific fields. 
-    # Note: If we wanted to merge, we'd adds ?updateMask.fieldPaths=site&...
-    # But here we probably want to overwrite the content fields.
-    response = requests.patch(url, json=firestore_data, headers=headers)
+    response = http_client.post(url, json={"writes": [write]}, headers=headers)
     
     if response.status_code != 200:
-        print(f"Firestore Update Error: {response.status_code}")
-        print(response.text)
-        return jsonify({'error': 'Firestore Error', 'details': response.text}), response.status_code
+        log.warning("Firestore update failed", extra={'fields': {'uid': uid, 'status': response.status_code}})
+        log.debug("Firestore update error body", extra={'fields': {'body': response.text}})
+        return _firestore_error(response)
         
-    return jsonify({'id': entry_id, 'message': 'Password updated successfully'}), 200
+    resp = jsonify({'id': entry_id, 'message': 'Password updated successfully'})
+    resp.set_etag(_entry_etag(response.json()['writeResults'][0]))
+    return resp, 200
+
+# ==========================================
+# BATCH READS
+# ==========================================
+
+# IDs per documents:batchGet call; results are streamed back chunk by chunk
+BATCH_GET_CHUNK_SIZE = 100
+MAX_BATCH_GET_IDS = 1000
+
+def _stream_batch_get(uid, token, ids, mask):
+    url = f"{get_firestore_base_url()}:batchGet"
+    headers = {"Authorization": f"Bearer {token}"}
+    prefix = f"{get_firestore_document_root()}/users/{uid}/vault/"
+
+    yield '['
+    first = True
+    for start in range(0, len(ids), BATCH_GET_CHUNK_SIZE):
+        chunk = ids[start:start + BATCH_GET_CHUNK_SIZE]
+        body = {"documents": [prefix + entry_id for entry_id in chunk]}
+        if mask:
+            body["mask"] = {"fieldPaths": mask}
+
+        response = http_client.post(url, json=body, headers=headers, retry=True)
+        found = {}
+        if response.status_code == 200:
+            # batchGet answers in arbitrary order, one {found} or {missing} per document
+            for result in response.json():
+                if 'found' in result:
+                    found[result['found']['name'].split('/')[-1]] = result['found']
+        else:
+            log.warning("Firestore batchGet failed", extra={'fields': {'uid': uid, 'status': response.status_code}})
+
+        for entry_id in chunk:
+            doc = found.get(entry_id)
+            if doc is not None:
+                item = document_to_item(doc, mask)
+            elif response.status_code == 200:
+                item = {'id': entry_id, 'error': 'not_found'}
+            else:
+                item = {'id': entry_id, 'error': 'Firestore Error'}
+            yield dumps(item) if first else ',' + dumps(item)
+            first = False
+    yield ']'
+
+def batch_get():
+    uid = request.uid
+    token = request.token
+    data = request.json or {}
+
+    ids = data.get('ids')
+    if not isinstance(ids, list) or not ids:
+        return jsonify({'error': 'ids must be a non-empty list'}), 400
+    if len(ids) > MAX_BATCH_GET_IDS:
+        return jsonify({'error': f'At most {MAX_BATCH_GET_IDS} ids per request'}), 400
+    if not all(_is_doc_id(i) for i in ids):
+        return jsonify({'error': 'ids must be document IDs'}), 400
+
+    mask, error = _parse_field_mask()
+    if error:
+        return jsonify({'error': error}), 400
+
+    return Response(stream_with_context(_stream_batch_get(uid, token, ids, mask)), mimetype='application/json')
+
+# ==========================================
+# BATCH WRITES
+# ==========================================
+
+# Firestore accepts at most 500 writes per batchWrite call
+BATCH_WRITE_CHUNK_SIZE = 500
+MAX_BATCH_OPERATIONS = 5000
+
+_DOC_ID_ALPHABET = string.ascii_letters + string.digits
+
+def _new_doc_id():
+    # Same shape as Firestore's auto-generated IDs
+    return ''.join(secrets.choice(_DOC_ID_ALPHABET) for _ in range(20))
+
+def _batch_write_op(uid, op, index):
+    """
+    Turn one client operation into Firestore Writes.
+    Returns (writes, result); writes is empty when the operation is invalid.
+    The first write carries the operation's status.
+    """
+    if not isinstance(op, dict):
+        return [], {'index': index, 'status': 'error', 'error': 'Operation must be an object'}
+
+    kind = op.get('op')
+    entry_id = op.get('id')
+    data = op.get('data') or {}
+    required_fields = ['site', 'username', 'encryptedPassword', 'iv']
+    result = {'index': index, 'op': kind}
+
+    if kind not in ('create', 'update', 'delete'):
+        return [], {**result, 'status': 'error', 'error': "op must be 'create', 'update' or 'delete'"}
+    if kind in ('update', 'delete') and not entry_id:
+        return [], {**result, 'status': 'error', 'error': 'id is required'}
+    if kind in ('update', 'delete') and not _is_doc_id(entry_id):
+        return [], {**result, 'status': 'error', 'error': 'id must be a document ID'}
+    if kind in ('create', 'update') and not isinstance(data, dict):
+        return [], {**result, 'status': 'error', 'error': 'data must be an object'}
+    if kind in ('create', 'update') and not all(k in data for k in required_fields):
+        return [], {**result, 'status': 'error', 'error': 'Missing required fields'}
+
+    if kind == 'create':
+        entry_id = _new_doc_id()
+    name = f"{get_firestore_document_root()}/users/{uid}/vault/{entry_id}"
+    result['id'] = entry_id
+
+    if kind == 'delete':
+        return [{"delete": name}, _tombstone_write(uid, entry_id)], result
+
+    write = entry_write(name, data, created=kind == 'create')
+    # create must not clobber an existing doc; update must not create one
+    write["currentDocument"] = {"exists": kind == 'update'}
+    if kind == 'update':
+        write["updateMask"] = {"fieldPaths": required_fields + [DOMAIN_FIELD]}
+    return [write], result
+
+def batch_write():
+    uid = request.uid
+    token = request.token
+    data = request.json or {}
+
+    operations = data.get('operations')
+    if not isinstance(operations, list) or not operations:
+        return jsonify({'error': 'operations must be a non-empty list'}), 400
+    if len(operations) > MAX_BATCH_OPERATIONS:
+        return jsonify({'error': f'At most {MAX_BATCH_OPERATIONS} operations per request'}), 400
+
+    results = [None] * len(operations)
+    chunks = [[]]  # each chunk: [(index, writes)], at most BATCH_WRITE_CHUNK_SIZE writes
+
+    for index, op in enumerate(operations):
+        writes, result = _batch_write_op(uid, op, index)
+        results[index] = result
+        if not writes:
+            continue
+        # A delete and its tombstone always travel in the same request
+        if sum(len(w) for _, w in chunks[-1]) + len(writes) > BATCH_WRITE_CHUNK_SIZE:
+            chunks.append([])
+        chunks[-1].append((index, writes))
+
+    url = f"{get_firestore_base_url()}:batchWrite"
+    headers = {"Authorization": f"Bearer {token}"}
+
+    for chunk in chunks:
+        if not chunk:
+            continue
+        response = http_client.post(url, json={"writes": [w for _, writes in chunk for w in writes]}, headers=headers)
+
+        if response.status_code != 200:
+            log.warning("Firestore batchWrite failed", extra={'fields': {'uid': uid, 'status': response.status_code}})
+            for index, _ in chunk:
+                results[index].update({'status': 'error', 'error': 'Firestore Error', 'details': response.text})
+            continue
+
+        # batchWrite is not atomic: each write reports its own status (code 0 = OK),
+        # and an operation is only ok when all of its writes are
+        statuses = response.json().get('status', [])
+        position = 0
+        for index, writes in chunk:
+            op_statuses = statuses[position:position + len(writes)]
+            position += len(writes)
+            missing = [{'code': 2, 'message': 'No write status returned'}] * (len(writes) - len(op_statuses))
+            main, *follow_ups = op_statuses + missing
+            if main.get('code', 0) != 0:
+                results[index].update({'status': 'error', 'error': main.get('message', 'Write failed')})
+            elif any(status.get('code', 0) != 0 for status in follow_ups):
+                # Retrying the delete is safe and rewrites the tombstone
+                results[index].update({'status': 'error', 'error': 'Entry deleted, but the deletion was not recorded for sync; retry the delete'})
+            else:
+                results[index]['status'] = 'ok'
+
+    return jsonify({'results': results}), 200
+
+# ==========================================
+# DELTA SYNC
+# ==========================================
+
+# Deleted entry IDs are kept here so other devices can sync deletions
+TOMBSTONE_COLLECTION = 'vault_tombstones'
+
+def _tombstone_write(uid, entry_id):
+    name = f"{get_firestore_document_root()}/users/{uid}/{TOMBSTONE_COLLECTION}/{entry_id}"
+    return {"update": {"name": name, "fields": {}}, "updateTransforms": server_timestamps('deletedAt')}
+
+def _run_changes_query(uid, token, collection, field, position, limit):
+    """
+    Changes after `position` = (timestamp, document name or None), in
+    (field, __name__) order. Writes in one batch share a timestamp, so the
+    document name breaks ties and a page boundary never skips an entry.
+    """
+    url = f"{get_firestore_base_url()}/users/{uid}:runQuery"
+    headers = {"Authorization": f"Bearer {token}"}
+    timestamp, name = position
+    # A timestamp-only cursor (first sync) skips everything at that instant
+    values = [{"timestampValue": timestamp}]
+    if name:
+        values.append({"referenceValue": name})
+    query = {
+        "structuredQuery": {
+            "from": [{"collectionId": collection}],
+            "orderBy": [
+                {"field": {"fieldPath": field}, "direction": "ASCENDING"},
+                {"field": {"fieldPath": "__name__"}, "direction": "ASCENDING"},
+            ],
+            "startAt": {"values": values, "before": False},
+            "limit": limit,
+        }
+    }
+    return http_client.post(url, json=query, headers=headers, retry=True)
+
+def _parse_timestamp(raw):
+    try:
+        value = datetime.fromisoformat(raw.replace('Z', '+00:00'))
+    except (AttributeError, ValueError):
+        return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+def _parse_since(raw):
+    # Accept any RFC 3339 timestamp and normalise it to what Firestore expects
+    since = _parse_timestamp(raw)
+    if since is None:
+        return None
+    return since.replace(tzinfo=None).isoformat() + "Z"
+
+def _encode_cursor(positions):
+    raw = json.dumps({'updated': list(positions['updated']), 'deleted': list(positions['deleted'])}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+def _decode_cursor(raw):
+    """Opaque cursor from a previous /changes response -> {'updated': (ts, name), 'deleted': (ts, name)}."""
+    try:
+        data = json.loads(base64.urlsafe_b64decode(raw + '=' * (-len(raw) % 4)))
+        positions = {key: (data[key][0], data[key][1]) for key in ('updated', 'deleted')}
+    except (ValueError, TypeError, KeyError, IndexError, AttributeError):
+        return None
+    prefix = f"{get_firestore_document_root()}/users/{request.uid}/"
+    for timestamp, name in positions.values():
+        if not isinstance(timestamp, str) or _parse_timestamp(timestamp) is None:
+            return None
+        # Names are only ever ones we returned for this user
+        if name is not None and not (isinstance(name, str) and name.startswith(prefix)):
+            return None
+    return positions
+
+def _last_position(docs, field, position):
+    if not docs:
+        return position
+    return (docs[-1]['fields'][field]['timestampValue'], docs[-1]['name'])
+
+def get_changes():
+    """
+    Entries updated and deleted since the last sync.
+    Start with ?since=<RFC 3339 timestamp>, then pass the returned opaque
+    ?cursor= back; keep calling while hasMore is true.
+    """
+    uid = request.uid
+    token = request.token
+
+    if request.args.get('cursor'):
+        positions = _decode_cursor(request.args['cursor'])
+        if positions is None:
+            return jsonify({'error': 'Invalid cursor'}), 400
+    else:
+        since = _parse_since(request.args.get('since'))
+        if not since:
+            return jsonify({'error': 'since must be an RFC 3339 timestamp'}), 400
+        positions = {'updated': (since, None), 'deleted': (since, None)}
+
+    mask, error = _parse_field_mask()
+    if error:
+        return jsonify({'error': error}), 400
+
+    updated = _run_changes_query(uid, token, 'vault', 'updatedAt', positions['updated'], MAX_PAGE_SIZE)
+    if updated.status_code != 200:
+        return jsonify({'error': 'Firestore Error', 'details': updated.text}), updated.status_code
+
+    deleted = _run_changes_query(uid, token, TOMBSTONE_COLLECTION, 'deletedAt', positions['deleted'], MAX_PAGE_SIZE)
+    if deleted.status_code != 200:
+        return jsonify({'error': 'Firestore Error', 'details': deleted.text}), deleted.status_code
+
+    # runQuery returns one element per result, plus a bare {readTime} when empty
+    updated_docs = [r['document'] for r in updated.json() if 'document' in r]
+    deleted_docs = [r['document'] for r in deleted.json() if 'document' in r]
+
+    # Each collection resumes from the last document it returned, so a full
+    # page in one never makes the other skip or repeat entries
+    cursor = _encode_cursor({
+        'updated': _last_position(updated_docs, 'updatedAt', positions['updated']),
+        'deleted': _last_position(deleted_docs, 'deletedAt', positions['deleted']),
+    })
+
+    return json_response({
+        'updated': [document_to_item(doc, mask) for doc in updated_docs],
+        'deleted': [doc['name'].rsplit('/', 1)[-1] for doc in deleted_docs],
+        'cursor': cursor,
+        # Hit the page limit: call again with the returned cursor
+        'hasMore': len(updated_docs) >= MAX_PAGE_SIZE or len(deleted_docs) >= MAX_PAGE_SIZE,
+    })
+
+# ==========================================
+# AUTOFILL LOOKUP
+# ==========================================
+
+# Entries returned for one domain; more than this for a single site is unusual
+MAX_LOOKUP_RESULTS = 100
+
+def lookup_by_domain():
+    uid = request.uid
+    token = request.token
+
+    # Accept a hostname or full URL; match on the same normalisation used on write
+    domain = registrable_domain(request.args.get('domain'))
+    if not domain:
+        return jsonify({'error': 'domain is required'}), 400
+
+    mask, error = _parse_field_mask()
+    if error:
+        return jsonify({'error': error}), 400
+
+    url = f"{get_firestore_base_url()}/users/{uid}:runQuery"
+    headers = {"Authorization": f"Bearer {token}"}
+    query = {
+        "from": [{"collectionId": "vault"}],
+        "where": {
+            "fieldFilter": {
+                "field": {"fieldPath": DOMAIN_FIELD},
+                "op": "EQUAL",
+                "value": {"stringValue": domain},
+            }
+        },
+        # Most recently updated first; needs the (domain, updatedAt) index in firestore.indexes.json
+        "orderBy": [{"field": {"fieldPath": "updatedAt"}, "direction": "DESCENDING"}],
+        "limit": MAX_LOOKUP_RESULTS,
+    }
+    if mask:
+        query["select"] = {"fields": [{"fieldPath": f} for f in mask]}
+
+    response = http_client.post(url, json={"structuredQuery": query}, headers=headers, retry=True)
+    if response.status_code != 200:
+        log.warning("Firestore lookup failed", extra={'fields': {'uid': uid, 'status': response.status_code}})
+        log.debug("Firestore lookup error body", extra={'fields': {'body': response.text}})
+        return jsonify({'error': 'Firestore Error', 'details': response.text}), response.status_code
+
+    docs = [r['document'] for r in response.json() if 'document' in r]
+    return json_response([document_to_item(doc, mask) for doc in docs])
@@ -0,0 +1,126 @@
+import json
+import threading
+import time
+from flask import current_app
+from app.extensions import firestore as firestore_challenges
+from app.extensions.log import get_logger
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+log = get_logger(__name__)
+
+# WebAuthn challenges live for 5 minutes and are consumed exactly once
+CHALLENGE_TTL_SECONDS = 300
+
+
+class ChallengeStoreUnavailable(Exception):
+    """The challenge backend (Redis) could not be reached; callers answer 503."""
+
+
+class MemoryChallengeStore:
+    """
+    In-process store for single-instance deployments.
+    Challenges are popped under a lock, so a challenge can only be used once.
+    """
+
+    def __init__(self, ttl=CHALLENGE_TTL_SECONDS):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._challenges = {}
+
+    def store(self, user_id, challenge, type):
+        now = time.time()
+        with self._lock:
+            # Opportunistically drop expired challenges so the dict can't grow forever
+            expired = [k for k, (_, expires_at) in self._challenges.items() if expires_at <= now]
+            for k in expired:
+                del self._challenges[k]
+            self._challenges[user_id] = ({'challenge': challenge, 'type': type}, now + self.ttl)
+
+    def consume(self, user_id):
+        with self._lock:
+            entry = self._challenges.pop(user_id, None)
+        if entry is None:
+            return None
+        data, expires_at = entry
+        if time.time() > expires_at:
+            log.info("Challenge expired")
+            return None
+        return data
+
+
+class RedisChallengeStore:
+    """Shared store for multi-worker / multi-instance deployments."""
+
+    PREFIX = 'webauthn_challenge:'
+
+    def __init__(self, url, ttl=CHALLENGE_TTL_SECONDS):
+        if redis is None:
+            raise ImportError("The 'redis' package is required for CHALLENGE_STORE=redis")
+        self.ttl = ttl
+        self._client = redis.Redis.from_url(url, socket_timeout=0.5)
+
+    def store(self, user_id, challenge, type):
+        try:
+            self._client.setex(self.PREFIX + user_id, self.ttl, json.dumps({'challenge': challenge, 'type': type}))
+        except redis.RedisError as e:
+            log.error("Challenge store unavailable: %s", e)
+            raise ChallengeStoreUnavailable(str(e))
+
+    def consume(self, user_id):
+        # GET + DELETE in one MULTI block, so two concurrent verifies can't both read it
+        pipe = self._client.pipeline(transaction=True)
+        pipe.get(self.PREFIX + user_id)
+        pipe.delete(self.PREFIX + user_id)
+        try:
+            raw, _ = pipe.execute()
+        except redis.RedisError as e:
+            log.error("Challenge store unavailable: %s", e)
+            raise ChallengeStoreUnavailable(str(e))
+        if raw is None:
+            return None
+        return json.loads(raw)
+
+
+class FirestoreChallengeStore:
+    """The original webauthn_challenges collection; works everywhere but costs remote calls."""
+
+    def store(self, user_id, challenge, type):
+        firestore_challenges.store_challenge(user_id, challenge, type)
+
+    def consume(self, user_id):
+        return firestore_challenges.get_challenge(user_id)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_challenge_store(config):
+    """Return the process-wide challenge store selected by CHALLENGE_STORE."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                backend = config.get('CHALLENGE_STORE', 'firestore')
+                if backend == 'memory':
+                    _store = MemoryChallengeStore()
+                elif backend == 'redis':
+                    if not config.get('CHALLENGE_STORE_URL'):
+                        raise ValueError("CHALLENGE_STORE=redis requires CHALLENGE_STORE_URL")
+                    _store = RedisChallengeStore(config['CHALLENGE_STORE_URL'])
+                else:
+                    _store = FirestoreChallengeStore()
+    return _store
+
+
+def store_challenge(user_id, challenge, type):
+    get_challenge_store(current_app.config).store(user_id, challenge, type)
+
+
+def get_challenge(user_id):
+    # Get-and-delete: a challenge is only ever returned once
+    return get_challenge_store(current_app.config).consume(user_id)
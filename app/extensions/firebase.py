@@ -1,7 +1,8 @@
-import requests
+import threading
 from flask import current_app
-import firebase_admin
-from firebase_admin import credentials
+from app.extensions.log import get_logger
+
+log = get_logger(__name__)
 
 # We no longer use firebase_admin here because of the private key issues on the user's machine.
 # Instead, we will helpers to interact with the REST APIs.
@@ -9,11 +10,19 @@ from firebase_admin import credentials
 # Global to store init error for debugging
 INIT_ERROR = None
 
+# Set once init_firebase has run (successfully or not) in this process
+_initialized = False
+_init_lock = threading.Lock()
+
 def init_firebase(app):
-    global INIT_ERROR
+    global INIT_ERROR, _initialized
+    # firebase_admin is only imported here so LAZY_INIT deployments don't pay for it at startup
+    import firebase_admin
+    from firebase_admin import credentials
     # If already initialized (e.g., hot reload), skip
     if firebase_admin._apps:
-        print("Firebase Admin SDK already initialized, skipping.")
+        log.info("Firebase Admin SDK already initialized, skipping")
+        _initialized = True
         return
     try:
             # Clean up the private key
@@ -32,17 +41,44 @@ def init_firebase(app):
             }
             cred = credentials.Certificate(cert)
             firebase_admin.initialize_app(cred)
-            print("Firebase Admin SDK Initialized Successfully")
+            # Client itself is created lazily on first use (per process)
+            from app.extensions.firestore import FirestoreClient
+            FirestoreClient.configure(app.config)
+            # Parse the key once more for local custom-token signing
+            from app.services.token_minter import token_minter
+            token_minter.configure(private_key, app.config['FIREBASE_CLIENT_EMAIL'],
+                                   reuse_seconds=app.config.get('CUSTOM_TOKEN_REUSE_SECONDS', 0))
+            log.info("Firebase Admin SDK initialized")
     except Exception as e:
         import traceback
         raw_key_preview = repr(app.config.get('FIREBASE_PRIVATE_KEY', 'NOT_SET'))[:100]
         INIT_ERROR = f"Error: {str(e)}\nRaw Key repr(): {raw_key_preview}...\nTrace:\n{traceback.format_exc()}"
-        print(f"CRITICAL: Failed to initialize Firebase Admin SDK: {e}")
+        log.critical("Failed to initialize Firebase Admin SDK: %s", e)
+    # Not retried on failure, same as the eager path; INIT_ERROR explains why
+    _initialized = True
+
+def ensure_firebase():
+    """
+    Initialize the Admin SDK on first use when LAZY_INIT is on.
+    Cheap after the first call; FirestoreClient calls this before creating a client.
+    """
+    if _initialized:
+        return
+    with _init_lock:
+        if not _initialized:
+            init_firebase(current_app._get_current_object())
 
 def get_google_auth_url():
     api_key = current_app.config['FIREBASE_API_KEY']
-    return f"https://identitytoolkit.googleapis.com/v1/accounts:lookup?key={api_key}"
+    base_url = current_app.config['IDENTITY_TOOLKIT_BASE_URL'].rstrip('/')
+    return f"{base_url}/v1/accounts:lookup?key={api_key}"
 
 def get_firestore_base_url():
     project_id = current_app.config['FIREBASE_PROJECT_ID']
-    return f"https://firestore.googleapis.com/v1/projects/{project_id}/databases/(default)/documents"
+    base_url = current_app.config['FIRESTORE_BASE_URL'].rstrip('/')
+    return f"{base_url}/v1/projects/{project_id}/databases/(default)/documents"
+
+def get_firestore_document_root():
+    # Resource name prefix used inside batch/commit/query request bodies
+    project_id = current_app.config['FIREBASE_PROJECT_ID']
+    return f"projects/{project_id}/databases/(default)/documents"
@@ -1,46 +1,144 @@
 from firebase_admin import firestore
+import firebase_admin
+import os
+import threading
 from datetime import datetime, timezone, timedelta
 from flask import current_app
+from app.extensions.metrics import timed
+from app.extensions.log import get_logger
+
+log = get_logger(__name__)
 
 class FirestoreClient:
     """
     Wrapper around Firestore Admin SDK.
+    Holds one client per process (rebuilt after fork, so it is safe with
+    gunicorn --preload) and caches collection references.
     """
-    
+
+    _db = None
+    _db_pid = None
+    _lock = threading.Lock()
+    _collections = {}
+    _grpc_options = None
+
+    # Per-user subcollections make the reference cache unbounded; reset past this size
+    MAX_CACHED_COLLECTIONS = 10000
+
     @staticmethod
-    def get_db():
+    def configure(config):
+        """Read gRPC channel options, e.g. FIRESTORE_GRPC_OPTIONS='grpc.keepalive_time_ms=30000'."""
+        options = []
+        for item in (config.get('FIRESTORE_GRPC_OPTIONS') or '').split(','):
+            if '=' not in item:
+                continue
+            key, value = (part.strip() for part in item.split('=', 1))
+            options.append((key, int(value) if value.lstrip('-').isdigit() else value))
+        FirestoreClient._grpc_options = options or None
+
+    @staticmethod
+    def _create_client():
+        from google.cloud import firestore as cloud_firestore
+
+        app = firebase_admin.get_app()
+        db = cloud_firestore.Client(project=app.project_id, credentials=app.credential.get_credential())
+
+        if FirestoreClient._grpc_options:
+            FirestoreClient._apply_grpc_options(db)
+        return db
+
+    @staticmethod
+    def _apply_grpc_options(db):
+        # The library hardcodes its channel options and has no public hook for
+        # them, so swap in our own transport. This relies on Client internals
+        # (_target, _credentials, _firestore_api_internal) of the
+        # google-cloud-firestore version pinned in requirements.txt; if they
+        # change, keep the library's default channel rather than failing.
+        target = getattr(db, '_target', None)
+        credentials = getattr(db, '_credentials', None)
+        if not target or not hasattr(db, '_firestore_api_internal'):
+            log.warning("Firestore client internals changed; using default gRPC channel options")
+            return
         try:
-            return firestore.client()
-        except Exception as e:
-            print(f"Error getting Firestore client: {e}")
-            return None
+            from google.cloud.firestore_v1.services.firestore import client as firestore_api
+            from google.cloud.firestore_v1.services.firestore.transports import grpc as firestore_grpc
+            channel = firestore_grpc.FirestoreGrpcTransport.create_channel(
+                target, credentials=credentials, options=FirestoreClient._grpc_options
+            )
+            transport = firestore_grpc.FirestoreGrpcTransport(channel=channel)
+            db._firestore_api_internal = firestore_api.FirestoreClient(transport=transport)
+        except (ImportError, AttributeError, TypeError) as e:
+            log.warning("Could not apply Firestore gRPC options, using defaults: %s", e)
 
     @staticmethod
-    def get_doc(collection, doc_id):
+    def get_db():
+        pid = os.getpid()
+        if FirestoreClient._db is not None and FirestoreClient._db_pid == pid:
+            return FirestoreClient._db
+
+        with FirestoreClient._lock:
+            if FirestoreClient._db is None or FirestoreClient._db_pid != pid:
+                try:
+                    from app.extensions.firebase import ensure_firebase
+                    ensure_firebase()
+                    FirestoreClient._db = FirestoreClient._create_client()
+                    FirestoreClient._db_pid = pid
+                    FirestoreClient._collections = {}
+                except Exception as e:
+                    log.error("Error getting Firestore client: %s", e)
+                    return None
+        return FirestoreClient._db
+
+    @staticmethod
+    def collection(path):
         db = FirestoreClient.get_db()
         if not db: return None
+
+        ref = FirestoreClient._collections.get(path)
+        if ref is None:
+            if len(FirestoreClient._collections) >= FirestoreClient.MAX_CACHED_COLLECTIONS:
+                FirestoreClient._collections = {}
+            ref = FirestoreClient._collections[path] = db.collection(path)
+        return ref
+
+    @staticmethod
+    def get_doc(collection, doc_id):
+        col = FirestoreClient.collection(collection)
+        if col is None: return None
         
         try:
-            doc_ref = db.collection(collection).document(doc_id)
-            doc = doc_ref.get()
+            with timed('firestore_admin', op='get_doc'):
+                doc = col.document(doc_id).get()
             if doc.exists:
                 return doc.to_dict()
             return None
         except Exception as e:
-            print(f"Error reading doc {collection}/{doc_id}: {e}")
+            log.error("Error reading doc %s/%s: %s", collection, doc_id, e)
+            return None
+
+    @staticmethod
+    def list_docs(collection):
+        col = FirestoreClient.collection(collection)
+        if col is None: return None
+        
+        try:
+            with timed('firestore_admin', op='list_docs'):
+                return {doc.id: doc.to_dict() for doc in col.stream()}
+        except Exception as e:
+            log.error("Error listing %s: %s", collection, e)
             return None
 
     @staticmethod
     def update_doc(collection, doc_id, data):
-        db = FirestoreClient.get_db()
-        if not db: return False
+        col = FirestoreClient.collection(collection)
+        if col is None: return False
         
         try:
-            doc_ref = db.collection(collection).document(doc_id)
-            doc_ref.set(data, merge=True)
+            with timed('firestore_admin', op='update_doc'):
+                col.document(doc_id).set(data, merge=True)
             return True
         except Exception as e:
-            print(f"Error updating doc {collection}/{doc_id}: {e}")
+            log.error("Error updating doc %s/%s: %s", collection, doc_id, e)
             return False
 
 # Challenge Storage (No In-Memory Logic)
@@ -52,47 +150,111 @@ def store_challenge(user_id, challenge, type):
     try:
         # Store in 'webauthn_challenges' collection
         # Expires in 5 minutes
-        db.collection('webauthn_challenges').document(user_id).set({
-            'challenge': challenge,
-            'type': type,
-            'created_at': firestore.SERVER_TIMESTAMP,
-            'expires_at': datetime.now(timezone.utc) + timedelta(minutes=5)
-        })
-        print(f"Stored challenge for {user_id} in Firestore.")
+        with timed('firestore_admin', op='store_challenge'):
+            FirestoreClient.collection('webauthn_challenges').document(user_id).set({
+                'challenge': challenge,
+                'type': type,
+                'created_at': firestore.SERVER_TIMESTAMP,
+                'expires_at': datetime.now(timezone.utc) + timedelta(minutes=5)
+            })
+        log.debug("Stored challenge for %s in Firestore", user_id)
     except Exception as e:
-        print(f"Error storing challenge: {e}")
+        log.error("Error storing challenge: %s", e)
         raise e
 
 def get_challenge(user_id):
     db = FirestoreClient.get_db()
     if not db:
-        print("Firestore not initialized, cannot get challenge")
+        log.error("Firestore not initialized, cannot get challenge")
         return None
 
     try:
-        doc_ref = db.collection('webauthn_challenges').document(user_id)
-        doc = doc_ref.get()
-        
-        if not doc.exists:
-            print(f"Challenge not found for {user_id}")
-            return None
-            
-        data = doc.to_dict()
-        
-        # Verify expiration
-        expires_at = data.get('expires_at')
-        if expires_at:
-            # Firestore returns datetime with timezone
-            now = datetime.now(timezone.utc)
-            if now > expires_at:
-                print("Challenge expired")
-                doc_ref.delete()
-                return None
-        
-        # Delete after use to prevent replay
-        doc_ref.delete()
-        
-        return data
+        doc_ref = FirestoreClient.collection('webauthn_challenges').document(user_id)
+        # Read and delete inside one transaction: if two verify calls race,
+        # the loser's commit fails and retries, then finds nothing.
+        with timed('firestore_admin', op='consume_challenge'):
+            return _consume_challenge(db.transaction(), doc_ref)
     except Exception as e:
-        print(f"Error retrieving challenge: {e}")
+        log.error("Error retrieving challenge: %s", e)
         return None
+
+@firestore.transactional
+def _consume_challenge(transaction, doc_ref):
+    doc = doc_ref.get(transaction=transaction)
+
+    if not doc.exists:
+        log.info("Challenge not found for %s", doc_ref.id)
+        return None
+
+    # Delete after use to prevent replay (expired ones are removed too)
+    transaction.delete(doc_ref)
+    data = doc.to_dict()
+
+    # Verify expiration
+    expires_at = data.get('expires_at')
+    # Firestore returns datetime with timezone
+    if expires_at and datetime.now(timezone.utc) > expires_at:
+        log.info("Challenge expired")
+        return None
+
+    return data
+
+def cleanup_expired_challenges(batch_size=500):
+    """
+    Delete challenges that were never consumed.
+    Prefer a Firestore TTL policy on webauthn_challenges.expires_at:
+        gcloud firestore fields ttls update expires_at --collection-group=webauthn_challenges --enable-ttl
+    This is the fallback for projects without one (see `flask cleanup-challenges`).
+    """
+    db = FirestoreClient.get_db()
+    if not db:
+        raise Exception("Firestore not initialized, cannot clean up challenges")
+
+    deleted = 0
+    now = datetime.now(timezone.utc)
+    while True:
+        docs = list(
+            FirestoreClient.collection('webauthn_challenges')
+            .where('expires_at', '<', now)
+            .limit(batch_size)
+            .stream()
+        )
+        if not docs:
+            return deleted
+        batch = db.batch()
+        for doc in docs:
+            batch.delete(doc.reference)
+        batch.commit()
+        deleted += len(docs)
+
+def backfill_vault_domains(batch_size=500):
+    """
+    Write the derived 'domain' field on vault entries created before it existed,
+    so /api/vault/lookup finds them (see `flask backfill-vault-domains`).
+    updatedAt is left alone: the field is server-side only, so clients have nothing to re-sync.
+    """
+    from app.services.site_domain import registrable_domain
+    from app.services.vault_codec import DOMAIN_FIELD
+
+    db = FirestoreClient.get_db()
+    if not db:
+        raise Exception("Firestore not initialized, cannot backfill vault domains")
+
+    updated = 0
+    batch = db.batch()
+    pending = 0
+    for doc in db.collection_group('vault').stream():
+        data = doc.to_dict()
+        if DOMAIN_FIELD in data or 'site' not in data:
+            continue
+        batch.update(doc.reference, {DOMAIN_FIELD: registrable_domain(data['site'])})
+        pending += 1
+        if pending >= batch_size:
+            batch.commit()
+            updated += pending
+            batch = db.batch()
+            pending = 0
+    if pending:
+        batch.commit()
+        updated += pending
+    return updated
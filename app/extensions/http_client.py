@@ -0,0 +1,136 @@
+import os
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from flask import current_app
+from app.extensions.metrics import record_upstream
+from app.extensions.log import get_logger
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+# Shared REST client for Firestore and Identity Toolkit calls.
+# One pooled keep-alive session per worker process, so we only pay the TLS
+# handshake to googleapis.com once instead of on every request.
+
+log = get_logger(__name__)
+
+RETRY_STATUS_CODES = (429, 503)
+
+# Retried by default. Firestore document PATCH sets fields to the given values,
+# so repeating it is harmless; POSTs (creates, commits) are only retried when
+# the caller says the call is a read (retry=True).
+IDEMPOTENT_METHODS = ('GET', 'HEAD', 'OPTIONS', 'PATCH', 'DELETE')
+
+# Exceptions callers can catch regardless of which transport is active
+REQUEST_ERRORS = (requests.RequestException,) + ((httpx.HTTPError,) if httpx else ())
+
+_session = None
+_session_pid = None
+_session_lock = threading.Lock()
+
+
+def _build_session(config):
+    if config.get('HTTP_CLIENT_HTTP2'):
+        if httpx is None:
+            log.warning("HTTP_CLIENT_HTTP2 is set but httpx is not installed, using requests")
+        else:
+            limits = httpx.Limits(
+                max_connections=config.get('HTTP_CLIENT_POOL_SIZE', 20),
+                max_keepalive_connections=config.get('HTTP_CLIENT_POOL_SIZE', 20),
+            )
+            return httpx.Client(http2=True, limits=limits)
+
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=config.get('HTTP_CLIENT_POOL_CONNECTIONS', 4),
+        pool_maxsize=config.get('HTTP_CLIENT_POOL_SIZE', 20),
+        max_retries=0,  # Retries are handled in request() so they cover every transport
+    )
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def get_session():
+    """
+    Return this process's pooled session.
+    Rebuilt after a fork so gunicorn workers never share sockets with the master.
+    """
+    global _session, _session_pid
+    pid = os.getpid()
+    if _session is None or _session_pid != pid:
+        with _session_lock:
+            if _session is None or _session_pid != pid:
+                _session = _build_session(current_app.config)
+                _session_pid = pid
+    return _session
+
+
+def _timeout(config):
+    connect = config.get('HTTP_CLIENT_CONNECT_TIMEOUT', 3.05)
+    read = config.get('HTTP_CLIENT_READ_TIMEOUT', 10)
+    if httpx is not None and isinstance(_session, httpx.Client):
+        return httpx.Timeout(read, connect=connect)
+    return (connect, read)
+
+
+def _retry_delay(response, attempt, backoff):
+    retry_after = response.headers.get('Retry-After')
+    if retry_after and retry_after.isdigit():
+        return min(int(retry_after), 10)
+    return backoff * (2 ** attempt)
+
+
+def request(method, url, retry=None, **kwargs):
+    """
+    Send a request through the pooled session with default timeouts.
+    429 and 503 responses to idempotent requests are retried with exponential
+    backoff; a 503 may arrive after a write was applied, so a retried create
+    could duplicate it. Total sleep is capped so a worker isn't held for long.
+    """
+    config = current_app.config
+    session = get_session()
+    kwargs.setdefault('timeout', _timeout(config))
+    if retry is None:
+        retry = method.upper() in IDEMPOTENT_METHODS
+    max_retries = config.get('HTTP_CLIENT_MAX_RETRIES', 2) if retry else 0
+    backoff = config.get('HTTP_CLIENT_BACKOFF_FACTOR', 0.2)
+    sleep_budget = config.get('HTTP_CLIENT_MAX_RETRY_SLEEP', 2.0)
+
+    attempt = 0
+    while True:
+        start = time.perf_counter()
+        try:
+            response = session.request(method, url, **kwargs)
+        except REQUEST_ERRORS:
+            record_upstream(url, method, 'error', time.perf_counter() - start)
+            raise
+        record_upstream(url, method, response.status_code, time.perf_counter() - start)
+        if response.status_code not in RETRY_STATUS_CODES or attempt >= max_retries:
+            return response
+        delay = _retry_delay(response, attempt, backoff)
+        if delay > sleep_budget:
+            return response
+        sleep_budget -= delay
+        time.sleep(delay)
+        attempt += 1
+
+
+def get(url, **kwargs):
+    return request('GET', url, **kwargs)
+
+
+def post(url, **kwargs):
+    return request('POST', url, **kwargs)
+
+
+def patch(url, **kwargs):
+    return request('PATCH', url, **kwargs)
+
+
+def delete(url, **kwargs):
+    return request('DELETE', url, **kwargs)
@@ -0,0 +1,141 @@
+import os
+import random
+import sqlite3
+import threading
+import time
+from urllib.parse import urlparse
+from flask_limiter import Limiter
+from flask_limiter.util import get_remote_address
+from limits.storage import Storage
+
+try:
+    from gevent import monkey as gevent_monkey
+except ImportError:
+    gevent_monkey = None
+
+# Shared Limiter instance so blueprints can declare per-route limits.
+# Keys on the client IP, which create_app recovers from X-Forwarded-For via
+# ProxyFix (PROXY_FIX_X_FOR); without it every user shares the proxy's bucket.
+# Storage comes from RATELIMIT_STORAGE_URI:
+#   memory://                    - per process (limits are multiplied by worker count)
+#   sqlite:///tmp/ratelimit.db   - shared by all workers on one host
+#   redis://host:6379            - shared across hosts
+limiter = Limiter(
+    get_remote_address,
+    default_limits=["2000 per day", "500 per hour"],
+)
+
+
+def _off_hub(fn, *args):
+    """
+    Run a blocking SQLite call. Under the gevent worker it goes to gevent's
+    native threadpool, so a writer waiting on another worker's lock (up to the
+    5 s busy timeout) doesn't stall every other greenlet in this process.
+    """
+    if gevent_monkey is not None and gevent_monkey.is_module_patched('threading'):
+        from gevent import get_hub
+        return get_hub().threadpool.apply(fn, args)
+    return fn(*args)
+
+
+class SQLiteStorage(Storage):
+    """
+    File-backed fixed-window storage for the `limits` library.
+    SQLite handles cross-process locking, so every gunicorn worker on the host
+    sees the same counters, and they survive restarts.
+    Registered for the sqlite:// scheme via STORAGE_SCHEME.
+
+    Each process holds one connection, serialised by a lock. A per-thread
+    connection would be per *greenlet* under gevent, i.e. a new connection
+    (and PRAGMAs) on every request.
+    """
+
+    STORAGE_SCHEME = ["sqlite"]
+
+    def __init__(self, uri, wrap_exceptions=False, **options):
+        path = urlparse(uri).path or '/tmp/ratelimit.db'
+        self._path = path
+        self._lock = threading.Lock()
+        self._conn = None
+        self._pid = None
+        super().__init__(uri, wrap_exceptions=wrap_exceptions, **options)
+        self._run(lambda conn: conn.execute(
+            "CREATE TABLE IF NOT EXISTS counters (key TEXT PRIMARY KEY, count INTEGER NOT NULL, expiry REAL NOT NULL)"
+        ))
+
+    @property
+    def base_exceptions(self):
+        return sqlite3.Error
+
+    def _connect(self):
+        conn = sqlite3.connect(self._path, timeout=5, isolation_level=None, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _run(self, fn):
+        """Call fn(conn) on this process's connection, one caller at a time."""
+        if self._pid != os.getpid():
+            # Forked worker: the parent's connection and lock must not be reused
+            self._lock = threading.Lock()
+            self._conn = None
+            self._pid = os.getpid()
+        with self._lock:
+            if self._conn is None:
+                self._conn = _off_hub(self._connect)
+            return _off_hub(fn, self._conn)
+
+    def incr(self, key, expiry, amount=1):
+        return self._run(lambda conn: self._incr(conn, key, expiry, amount))
+
+    @staticmethod
+    def _incr(conn, key, expiry, amount):
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT count, expiry FROM counters WHERE key = ?", (key,)).fetchone()
+            if row is None or row[1] <= now:
+                count, expires_at = amount, now + expiry
+            else:
+                count, expires_at = row[0] + amount, row[1]
+            conn.execute(
+                "INSERT OR REPLACE INTO counters (key, count, expiry) VALUES (?, ?, ?)",
+                (key, count, expires_at),
+            )
+            if random.random() < 0.001:
+                # Occasionally drop expired windows so the table doesn't grow forever
+                conn.execute("DELETE FROM counters WHERE expiry <= ?", (now,))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return count
+
+    def get(self, key):
+        row = self._run(lambda conn: conn.execute(
+            "SELECT count FROM counters WHERE key = ? AND expiry > ?", (key, time.time())
+        ).fetchone())
+        return row[0] if row else 0
+
+    def get_expiry(self, key):
+        row = self._run(lambda conn: conn.execute(
+            "SELECT expiry FROM counters WHERE key = ? AND expiry > ?", (key, time.time())
+        ).fetchone())
+        return row[0] if row else time.time()
+
+    def check(self):
+        try:
+            self._run(lambda conn: conn.execute("SELECT 1"))
+            return True
+        except sqlite3.Error:
+            return False
+
+    def reset(self):
+        def delete_all(conn):
+            count = conn.execute("SELECT COUNT(*) FROM counters").fetchone()[0]
+            conn.execute("DELETE FROM counters")
+            return count
+        return self._run(delete_all)
+
+    def clear(self, key):
+        self._run(lambda conn: conn.execute("DELETE FROM counters WHERE key = ?", (key,)))
@@ -0,0 +1,128 @@
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import re
+import sys
+from datetime import datetime, timezone
+
+# Structured, non-blocking logging.
+# Request threads only put records on an in-memory queue; a background
+# QueueListener formats them as JSON lines and writes them to stdout, so a slow
+# log collector never adds latency to a request.
+#
+#   log = get_logger(__name__)
+#   log.info("Firestore list failed", extra={'fields': {'status': 503}})
+
+ROOT_LOGGER = 'passman'
+
+_JWT_RE = re.compile(r'eyJ[\w-]+\.[\w-]+\.[\w-]*')
+_BEARER_RE = re.compile(r'(Bearer\s+)\S+', re.IGNORECASE)
+_SENSITIVE_KEYS = {'token', 'idtoken', 'authorization', 'secret', 'twofactorsecret', 'private_key', 'password'}
+
+_listener = None
+
+
+def get_logger(name):
+    if name.startswith('app.'):
+        name = name[len('app.'):]
+    return logging.getLogger(f'{ROOT_LOGGER}.{name}')
+
+
+def redact(value):
+    if isinstance(value, str):
+        return _BEARER_RE.sub(r'\1[REDACTED]', _JWT_RE.sub('[REDACTED_JWT]', value))
+    if isinstance(value, dict):
+        return {k: '[REDACTED]' if k.lower() in _SENSITIVE_KEYS else redact(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [redact(v) for v in value]
+    return value
+
+
+class RedactionFilter(logging.Filter):
+    """Strip ID tokens, bearer headers and secrets before anything is queued."""
+
+    def filter(self, record):
+        record.msg = redact(record.getMessage())
+        record.args = None
+        fields = getattr(record, 'fields', None)
+        if fields:
+            record.fields = redact(fields)
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Keep only a fraction of DEBUG records; everything INFO and above passes."""
+
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        if record.levelno > logging.DEBUG or self.rate >= 1:
+            return True
+        return random.random() < self.rate
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """
+    The stock QueueHandler folds the traceback into the message; keep it as a
+    separate (redacted) field instead and leave formatting to the listener.
+    """
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        if record.exc_info:
+            record.exc_text = redact(logging.Formatter().formatException(record.exc_info))
+            record.exc_info = None
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        fields = getattr(record, 'fields', None)
+        if fields:
+            entry.update(fields)
+        if record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+def setup_logging(app):
+    """Route the 'passman' loggers (and Flask's app.logger) through a queue to a background writer."""
+    global _listener
+
+    logger = logging.getLogger(ROOT_LOGGER)
+    logger.setLevel(app.config.get('LOG_LEVEL', 'INFO'))
+    logger.propagate = False
+
+    if _listener is None:
+        log_queue = queue.SimpleQueue()
+        stream = logging.StreamHandler(sys.stdout)
+        if app.config.get('LOG_FORMAT', 'json') == 'json':
+            stream.setFormatter(JsonFormatter())
+        else:
+            stream.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s: %(message)s'))
+
+        queue_handler = _QueueHandler(log_queue)
+        queue_handler.addFilter(SamplingFilter(app.config.get('LOG_DEBUG_SAMPLE_RATE', 1.0)))
+        queue_handler.addFilter(RedactionFilter())
+        logger.handlers = [queue_handler]
+
+        _listener = logging.handlers.QueueListener(log_queue, stream, respect_handler_level=True)
+        _listener.start()
+        atexit.register(_listener.stop)
+
+    # Flask's own logger (unhandled exceptions) goes through the same queue
+    app.logger.handlers = logger.handlers
+    app.logger.setLevel(logger.level)
@@ -0,0 +1,190 @@
+import hmac
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlparse
+from flask import g, has_request_context, request, current_app, Response
+
+# Minimal in-process Prometheus registry plus per-request Server-Timing.
+# Metrics are per worker process; Prometheus sums them across scrapes by instance.
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _label_str(labels):
+    if not labels:
+        return ''
+    parts = ','.join(f'{k}="{_escape(v)}"' for k, v in sorted(labels))
+    return '{' + parts + '}'
+
+
+class Histogram:
+    def __init__(self, name, help, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._series = {}  # labels -> [bucket counts..., sum, count]
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            for key, series in self._series.items():
+                for bound, count in zip(self.buckets, series):
+                    lines.append(f'{self.name}_bucket{_label_str(key + (("le", bound),))} {count}')
+                lines.append(f'{self.name}_bucket{_label_str(key + (("le", "+Inf"),))} {series[-1]}')
+                lines.append(f'{self.name}_sum{_label_str(key)} {series[-2]}')
+                lines.append(f'{self.name}_count{_label_str(key)} {series[-1]}')
+        return lines
+
+
+class Counter:
+    def __init__(self, name, help):
+        self.name = name
+        self.help = help
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        with self._lock:
+            for key, value in self._values.items():
+                lines.append(f'{self.name}{_label_str(key)} {value}')
+        return lines
+
+
+REQUEST_LATENCY = Histogram('passman_request_duration_seconds', 'HTTP request latency by endpoint')
+SPAN_LATENCY = Histogram('passman_span_duration_seconds', 'Latency of hot-path operations (auth, Firestore, WebAuthn, serialization)')
+UPSTREAM_LATENCY = Histogram('passman_upstream_duration_seconds', 'Outbound REST call latency by upstream')
+UPSTREAM_RESPONSES = Counter('passman_upstream_responses_total', 'Outbound REST responses by upstream and status code')
+
+_UPSTREAMS = {
+    'firestore.googleapis.com': 'firestore',
+    'identitytoolkit.googleapis.com': 'identitytoolkit',
+    'www.googleapis.com': 'google_certs',
+}
+
+
+def upstream_name(url):
+    host = urlparse(url).hostname or ''
+    if 'accounts:' in url:
+        return 'identitytoolkit'
+    return _UPSTREAMS.get(host, 'firestore' if '/documents' in url else host)
+
+
+def _add_server_timing(name, seconds):
+    if has_request_context():
+        timings = g.setdefault('server_timings', {})
+        timings[name] = timings.get(name, 0.0) + seconds
+
+
+@contextmanager
+def timed(name, **labels):
+    """Time a block: recorded in the span histogram and the request's Server-Timing header."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        SPAN_LATENCY.observe(elapsed, span=name, **labels)
+        _add_server_timing(name, elapsed)
+
+
+def record_upstream(url, method, status, seconds):
+    upstream = upstream_name(url)
+    UPSTREAM_LATENCY.observe(seconds, upstream=upstream, method=method)
+    UPSTREAM_RESPONSES.inc(upstream=upstream, status=status)
+    _add_server_timing(upstream, seconds)
+
+
+def _cache_lines():
+    """Gauges for the in-process caches, read at scrape time."""
+    from app.extensions.token_cache import _token_cache
+    from app.services.two_factor_cache import _cache as two_factor_cache
+    from app.services.token_minter import token_minter
+
+    lines = [
+        '# HELP passman_cache_requests_total Cache lookups by cache and result',
+        '# TYPE passman_cache_requests_total counter',
+    ]
+    for name, cache in (('id_token', _token_cache), ('two_factor', two_factor_cache)):
+        if cache is not None:
+            lines.append(f'passman_cache_requests_total{{cache="{name}",result="hit"}} {cache.hits}')
+            lines.append(f'passman_cache_requests_total{{cache="{name}",result="miss"}} {cache.misses}')
+
+    minter = token_minter.stats()
+    lines += [
+        '# HELP passman_custom_tokens_total Custom tokens returned by source',
+        '# TYPE passman_custom_tokens_total counter',
+        f'passman_custom_tokens_total{{source="minted"}} {minter["minted"]}',
+        f'passman_custom_tokens_total{{source="reused"}} {minter["reused"]}',
+        '# HELP passman_custom_token_sign_seconds_total Time spent RSA-signing custom tokens',
+        '# TYPE passman_custom_token_sign_seconds_total counter',
+        f'passman_custom_token_sign_seconds_total {minter["sign_seconds_total"]}',
+    ]
+    return lines
+
+
+def render_metrics():
+    lines = []
+    for metric in (REQUEST_LATENCY, SPAN_LATENCY, UPSTREAM_LATENCY, UPSTREAM_RESPONSES):
+        lines += metric.render()
+    lines += _cache_lines()
+    return '\n'.join(lines) + '\n'
+
+
+def init_metrics(app):
+    @app.before_request
+    def _start_timer():
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def _record_request(response):
+        started = g.get('request_started')
+        if started is None:
+            return response
+        elapsed = time.perf_counter() - started
+        REQUEST_LATENCY.observe(
+            elapsed,
+            endpoint=request.endpoint or 'unknown',
+            method=request.method,
+            status=response.status_code,
+        )
+        if app.config.get('SERVER_TIMING_ENABLED'):
+            timings = g.get('server_timings', {})
+            parts = [f'{name};dur={seconds * 1000:.1f}' for name, seconds in timings.items()]
+            parts.append(f'total;dur={elapsed * 1000:.1f}')
+            response.headers['Server-Timing'] = ', '.join(parts)
+        return response
+
+    @app.route('/metrics')
+    def metrics():
+        # Fail closed: without a configured token the endpoint doesn't exist
+        expected = current_app.config.get('METRICS_TOKEN')
+        if not expected:
+            return {'error': 'Not found'}, 404
+        supplied = request.headers.get('Authorization', '').encode('utf-8')
+        if not hmac.compare_digest(supplied, f'Bearer {expected}'.encode('utf-8')):
+            return {'error': 'Unauthorized'}, 401
+        return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
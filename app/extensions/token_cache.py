@@ -0,0 +1,160 @@
+import base64
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from app.extensions.log import get_logger
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+log = get_logger(__name__)
+
+
+def _token_key(token):
+    # Never keep raw tokens around; the hash is enough to identify them
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+
+def _token_exp(token):
+    """
+    Read 'exp' from the token payload without verifying it.
+    Only called after the token has been verified, to bound the cache TTL.
+    """
+    try:
+        payload_b64 = token.split('.')[1]
+        payload = json.loads(base64.urlsafe_b64decode(payload_b64 + '=' * (-len(payload_b64) % 4)))
+        return float(payload['exp'])
+    except (IndexError, KeyError, TypeError, ValueError):
+        return None
+
+
+class MemoryTokenCache:
+    """
+    Thread-safe in-process LRU of verified tokens -> (uid, email).
+    Each entry expires at the token's exp or after max_ttl seconds, whichever is first.
+    """
+
+    def __init__(self, max_size=10000, max_ttl=300):
+        self.max_size = max_size
+        self.max_ttl = max_ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, token):
+        key = _token_key(token)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            uid, email, expires_at = entry
+            if now >= expires_at:
+                del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return uid, email
+
+    def set(self, token, uid, email):
+        ttl = _cache_ttl(token, self.max_ttl)
+        if ttl <= 0:
+            return
+        key = _token_key(token)
+        with self._lock:
+            self._entries[key] = (uid, email, time.time() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            return {'backend': 'memory', 'size': len(self._entries), 'hits': self.hits, 'misses': self.misses}
+
+
+class RedisTokenCache:
+    """
+    Shared cache so all gunicorn workers (and hosts) reuse each other's verifications.
+    Expiry is delegated to Redis; hit/miss counters are per process.
+    """
+
+    PREFIX = 'idtoken:'
+
+    def __init__(self, url, max_ttl=300):
+        if redis is None:
+            raise ImportError("The 'redis' package is required for TOKEN_CACHE_URL")
+        self.max_ttl = max_ttl
+        self.hits = 0
+        self.misses = 0
+        self._client = redis.Redis.from_url(url, socket_timeout=0.5)
+
+    def get(self, token):
+        try:
+            raw = self._client.get(self.PREFIX + _token_key(token))
+        except redis.RedisError as e:
+            log.warning("Token cache read failed: %s", e)
+            raw = None
+        if raw is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        data = json.loads(raw)
+        return data['uid'], data.get('email')
+
+    def set(self, token, uid, email):
+        ttl = int(_cache_ttl(token, self.max_ttl))
+        if ttl <= 0:
+            return
+        try:
+            self._client.setex(self.PREFIX + _token_key(token), ttl, json.dumps({'uid': uid, 'email': email}))
+        except redis.RedisError as e:
+            log.warning("Token cache write failed: %s", e)
+
+    def clear(self):
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self):
+        return {'backend': 'redis', 'hits': self.hits, 'misses': self.misses}
+
+
+def _cache_ttl(token, max_ttl):
+    exp = _token_exp(token)
+    if exp is None:
+        return 0
+    return min(exp - time.time(), max_ttl)
+
+
+_token_cache = None
+_token_cache_lock = threading.Lock()
+
+
+def get_token_cache(config):
+    """Return the process-wide token cache, creating it from config on first use."""
+    global _token_cache
+    if _token_cache is None:
+        with _token_cache_lock:
+            if _token_cache is None:
+                max_ttl = config.get('TOKEN_CACHE_MAX_TTL', 300)
+                url = config.get('TOKEN_CACHE_URL')
+                if url:
+                    _token_cache = RedisTokenCache(url, max_ttl=max_ttl)
+                else:
+                    _token_cache = MemoryTokenCache(
+                        max_size=config.get('TOKEN_CACHE_MAX_SIZE', 10000),
+                        max_ttl=max_ttl,
+                    )
+    return _token_cache
@@ -0,0 +1,178 @@
+import base64
+import json
+import re
+import threading
+import time
+from app.extensions import http_client
+from cryptography import x509
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric import padding
+
+# Google publishes the certificates used to sign Firebase ID tokens here.
+# They rotate every few hours and the response carries a Cache-Control max-age.
+GOOGLE_CERTS_URL = "https://www.googleapis.com/robot/v1/metadata/x509/securetoken@system.gserviceaccount.com"
+
+# Used when Google does not send a usable max-age
+DEFAULT_CERTS_MAX_AGE = 3600
+
+# Allowed clock drift between us and Google when checking iat/auth_time.
+# exp gets no grace: an expired token is rejected as soon as it expires.
+CLOCK_SKEW_SECONDS = 60
+
+# An unknown kid forces a refetch at most this often, so forged tokens with
+# random kids can't turn every request into a call to Google
+MIN_FORCED_REFRESH_SECONDS = 60
+
+
+class TokenVerificationError(ValueError):
+    """The token is malformed, badly signed or its claims do not match."""
+
+
+class CertificateFetchError(Exception):
+    """Google's signing certificates could not be downloaded."""
+
+
+class _CertificateCache:
+    """
+    Process-wide cache of Google's public keys, keyed by 'kid'.
+    Refreshed lazily once the Cache-Control max-age has elapsed, or early
+    (throttled) when a token names a kid we don't know.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._keys = {}
+        self._expires_at = 0
+        self._fetched_at = 0
+
+    def get_key(self, kid):
+        keys = self._get_keys()
+        key = keys.get(kid)
+        if key is None:
+            # Google may have rotated keys before our cached copy expired
+            keys = self._get_keys(force_refresh=True)
+            key = keys.get(kid)
+        return key
+
+    def _get_keys(self, force_refresh=False):
+        if not force_refresh and self._keys and time.time() < self._expires_at:
+            return self._keys
+
+        with self._lock:
+            now = time.time()
+            # Another thread may have refreshed while we were waiting
+            if not force_refresh and self._keys and now < self._expires_at:
+                return self._keys
+            if force_refresh and self._keys and now - self._fetched_at < MIN_FORCED_REFRESH_SECONDS:
+                return self._keys
+            self._keys, self._expires_at = self._fetch()
+            self._fetched_at = now
+            return self._keys
+
+    @staticmethod
+    def _fetch():
+        try:
+            response = http_client.get(GOOGLE_CERTS_URL)
+            response.raise_for_status()
+            certs = response.json()
+        except http_client.REQUEST_ERRORS + (ValueError,) as e:
+            raise CertificateFetchError(f"Failed to fetch Google signing certificates: {e}")
+
+        keys = {}
+        for kid, pem in certs.items():
+            cert = x509.load_pem_x509_certificate(pem.encode('utf-8'))
+            keys[kid] = cert.public_key()
+
+        max_age = _parse_max_age(response.headers.get('Cache-Control', ''))
+        return keys, time.time() + max_age
+
+    def clear(self):
+        with self._lock:
+            self._keys = {}
+            self._expires_at = 0
+            self._fetched_at = 0
+
+
+_cert_cache = _CertificateCache()
+
+
+def _parse_max_age(cache_control):
+    match = re.search(r'max-age=(\d+)', cache_control)
+    if match:
+        return int(match.group(1))
+    return DEFAULT_CERTS_MAX_AGE
+
+
+def _b64url_decode(segment):
+    padded = segment + '=' * (-len(segment) % 4)
+    return base64.urlsafe_b64decode(padded.encode('ascii'))
+
+
+def verify_id_token_locally(token, project_id):
+    """
+    Verify a Firebase ID token in-process and return its claims.
+    Raises TokenVerificationError for bad tokens and CertificateFetchError
+    when Google's keys are unavailable.
+
+    Only the signature and claims are checked: unlike the Identity Toolkit
+    lookup, this does not notice a disabled user or revoked refresh tokens
+    until the ID token expires (at most an hour). FIREBASE_TOKEN_CHECK_REVOKED
+    adds that lookup back (see auth_middleware).
+    """
+    if not project_id:
+        raise TokenVerificationError("FIREBASE_PROJECT_ID is not configured")
+
+    try:
+        header_b64, payload_b64, signature_b64 = token.split('.')
+        header = json.loads(_b64url_decode(header_b64))
+        claims = json.loads(_b64url_decode(payload_b64))
+        signature = _b64url_decode(signature_b64)
+    except (ValueError, TypeError, AttributeError) as e:
+        raise TokenVerificationError(f"Malformed token: {e}")
+
+    if header.get('alg') != 'RS256':
+        raise TokenVerificationError("Unexpected token algorithm")
+
+    kid = header.get('kid')
+    if not kid:
+        raise TokenVerificationError("Token has no 'kid' header")
+
+    public_key = _cert_cache.get_key(kid)
+    if public_key is None:
+        raise TokenVerificationError("Token signed with an unknown key")
+
+    signing_input = f"{header_b64}.{payload_b64}".encode('ascii')
+    try:
+        public_key.verify(signature, signing_input, padding.PKCS1v15(), hashes.SHA256())
+    except InvalidSignature:
+        raise TokenVerificationError("Invalid token signature")
+
+    _verify_claims(claims, project_id)
+    return claims
+
+
+def _verify_claims(claims, project_id):
+    now = time.time()
+
+    if claims.get('aud') != project_id:
+        raise TokenVerificationError("Token has incorrect audience")
+
+    if claims.get('iss') != f"https://securetoken.google.com/{project_id}":
+        raise TokenVerificationError("Token has incorrect issuer")
+
+    sub = claims.get('sub')
+    if not isinstance(sub, str) or not sub or len(sub) > 128:
+        raise TokenVerificationError("Token has invalid subject")
+
+    exp = claims.get('exp')
+    if not isinstance(exp, (int, float)) or exp <= now:
+        raise TokenVerificationError("Token has expired")
+
+    iat = claims.get('iat')
+    if not isinstance(iat, (int, float)) or iat > now + CLOCK_SKEW_SECONDS:
+        raise TokenVerificationError("Token issued in the future")
+
+    auth_time = claims.get('auth_time')
+    if auth_time is not None and auth_time > now + CLOCK_SKEW_SECONDS:
+        raise TokenVerificationError("Token has invalid auth_time")
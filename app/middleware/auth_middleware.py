@@ -1,38 +1,109 @@
 from functools import wraps
-from flask import request, jsonify
-import requests
+from flask import request, jsonify, current_app
+from app.extensions import http_client
 from app.extensions.firebase import get_google_auth_url
+from app.extensions.token_verifier import verify_id_token_locally, TokenVerificationError, CertificateFetchError
+from app.extensions.token_cache import get_token_cache
+from app.extensions.metrics import timed
+from app.extensions.log import get_logger
+
+log = get_logger(__name__)
+
+def _verify_token_rest(token):
+    # Verify token using Google Identity Toolkit REST API
+    # This avoids needing the Admin SDK and Private Key
+    url = get_google_auth_url()
+    response = http_client.post(url, json={'idToken': token}, retry=True)
+
+    if response.status_code != 200:
+        return None
+
+    data = response.json()
+    # The response contains 'users' list. The first one is our user.
+    if 'users' not in data or not data['users']:
+        return None
+
+    user_data = data['users'][0]
+    if user_data.get('disabled'):
+        return None
+    return user_data['localId'], user_data.get('email')
+
+def _verify_token_local(token):
+    # Verify the JWT in-process against Google's cached signing keys
+    try:
+        claims = verify_id_token_locally(token, current_app.config['FIREBASE_PROJECT_ID'])
+    except TokenVerificationError:
+        return None
+    except CertificateFetchError as e:
+        if not current_app.config.get('FIREBASE_TOKEN_REST_FALLBACK'):
+            raise
+        log.warning("Local token verification unavailable, falling back to REST: %s", e)
+        return _verify_token_rest(token)
+
+    if current_app.config.get('FIREBASE_TOKEN_CHECK_REVOKED'):
+        # Disabled users and revoked sessions are only visible to Identity Toolkit
+        result = _verify_token_rest(token)
+        if not result or result[0] != claims['sub']:
+            return None
+
+    return claims['sub'], claims.get('email')
+
+def _authenticate():
+    """
+    Verify the request's bearer token and set request.uid/email/token.
+    Returns an error response, or None on success.
+    """
+    auth_header = request.headers.get('Authorization')
+    if not auth_header:
+        return jsonify({'error': 'No Authorization header provided'}), 401
+
+    try:
+        token = auth_header.split(" ")[1]
+
+        with timed('auth'):
+            cache = get_token_cache(current_app.config) if current_app.config.get('TOKEN_CACHE_ENABLED') else None
+            result = cache.get(token) if cache else None
+
+            if not result:
+                if current_app.config.get('FIREBASE_TOKEN_VERIFICATION') == 'local':
+                    result = _verify_token_local(token)
+                else:
+                    result = _verify_token_rest(token)
+
+                if not result:
+                    return jsonify({'error': 'Invalid or expired token'}), 401
+
+                if cache:
+                    cache.set(token, *result)
+
+        request.uid, request.email = result
+        request.token = token # Store token to forward to Firestore
+
+    except Exception as e:
+        return jsonify({'error': 'Token validation error', 'details': str(e)}), 401
+
+    return None
 
 def verify_firebase_token(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        auth_header = request.headers.get('Authorization')
-        if not auth_header:
-            return jsonify({'error': 'No Authorization header provided'}), 401
-
-        try:
-            token = auth_header.split(" ")[1]
-            
-            # Verify token using Google Identity Toolkit REST API
-            # This avoids needing the Admin SDK and Private Key
-            url = get_google_auth_url()
-            response = requests.post(url, json={'idToken': token}, timeout=10)
-            
-            if response.status_code != 200:
-                return jsonify({'error': 'Invalid or expired token'}), 401
-                
-            data = response.json()
-            # The response contains 'users' list. The first one is our user.
-            if 'users' not in data or not data['users']:
-                 return jsonify({'error': 'Token verification failed'}), 401
-                 
-            user_data = data['users'][0]
-            request.uid = user_data['localId']
-            request.email = user_data.get('email')
-            request.token = token # Store token to forward to Firestore
-            
-        except Exception as e:
-            return jsonify({'error': 'Token validation error', 'details': str(e)}), 401
+        error = _authenticate()
+        if error:
+            return error
+        return f(*args, **kwargs)
+    return decorated_function
 
+def optional_firebase_token(f):
+    """
+    Like verify_firebase_token, but a request without an Authorization header
+    continues anonymously (request.uid unset). A header that is present must
+    still carry a valid token.
+    """
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if request.headers.get('Authorization'):
+            error = _authenticate()
+            if error:
+                return error
         return f(*args, **kwargs)
     return decorated_function
@@ -1,32 +1,38 @@
-from flask import Blueprint
-from app.middleware.auth_middleware import verify_firebase_token
-from app.controllers.auth_controller import generate_2fa_secret, enable_2fa, disable_2fa, verify_2fa_login, get_2fa_status
+from flask import Blueprint, current_app
+from app.middleware.auth_middleware import verify_firebase_token, optional_firebase_token
+from app.extensions.limiter import limiter
 
 auth_bp = Blueprint('auth', __name__)
 
 @auth_bp.route('/2fa/generate', methods=['POST'])
 @verify_firebase_token
 def generate():
+    from app.controllers.auth_controller import generate_2fa_secret
     return generate_2fa_secret()
 
 @auth_bp.route('/2fa/enable', methods=['POST'])
 @verify_firebase_token
 def enable():
+    from app.controllers.auth_controller import enable_2fa
     return enable_2fa()
 
 @auth_bp.route('/2fa/disable', methods=['POST'])
 @verify_firebase_token
 def disable():
+    from app.controllers.auth_controller import disable_2fa
     return disable_2fa()
 
 @auth_bp.route('/2fa/verify', methods=['POST'])
+@limiter.limit(lambda: current_app.config['RATELIMIT_AUTH_VERIFY'])
 @verify_firebase_token
 def verify():
+    from app.controllers.auth_controller import verify_2fa_login
     return verify_2fa_login()
 
 @auth_bp.route('/2fa/status', methods=['GET'])
 @verify_firebase_token
 def status():
+    from app.controllers.auth_controller import get_2fa_status
     return get_2fa_status()
 
 @auth_bp.route('/webauthn/register/options', methods=['POST'])
@@ -36,17 +42,20 @@ def webauthn_reg_options():
     return webauthn_register_options()
 
 @auth_bp.route('/webauthn/register/verify', methods=['POST'])
+@limiter.limit(lambda: current_app.config['RATELIMIT_AUTH_VERIFY'])
 @verify_firebase_token
 def webauthn_reg_verify():
     from app.controllers.auth_controller import webauthn_register_verify
     return webauthn_register_verify()
 
 @auth_bp.route('/webauthn/login/options', methods=['POST'])
+@optional_firebase_token
 def webauthn_log_options():
     from app.controllers.auth_controller import webauthn_login_options
     return webauthn_login_options()
 
 @auth_bp.route('/webauthn/login/verify', methods=['POST'])
+@limiter.limit(lambda: current_app.config['RATELIMIT_AUTH_VERIFY'])
 def webauthn_log_verify():
     from app.controllers.auth_controller import webauthn_login_verify
     return webauthn_login_verify()
@@ -57,7 +66,9 @@ def firebase_status():
     try:
         from firebase_admin import firestore
         import firebase_admin
-        from app.extensions.firebase import INIT_ERROR
+        from app.extensions import firebase
+        firebase.ensure_firebase()
+        INIT_ERROR = firebase.INIT_ERROR
         
         if not firebase_admin._apps:
              return jsonify({
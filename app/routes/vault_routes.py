@@ -1,6 +1,7 @@
-from flask import Blueprint
+from flask import Blueprint, current_app
 from app.middleware.auth_middleware import verify_firebase_token
-from app.controllers.vault_controller import add_password, get_passwords, delete_password, get_password
+from app.extensions.limiter import limiter
+from app.controllers.vault_controller import add_password, get_passwords, delete_password, get_password, batch_write, batch_get, get_changes, lookup_by_domain
 
 vault_bp = Blueprint('vault', __name__)
 
@@ -10,10 +11,31 @@ def add():
     return add_password()
 
 @vault_bp.route('', methods=['GET'])
+@limiter.limit(lambda: current_app.config['RATELIMIT_VAULT_LIST'])
 @verify_firebase_token
 def list_all():
     return get_passwords()
 
+@vault_bp.route('/batch', methods=['POST'])
+@verify_firebase_token
+def batch():
+    return batch_write()
+
+@vault_bp.route('/changes', methods=['GET'])
+@verify_firebase_token
+def changes():
+    return get_changes()
+
+@vault_bp.route('/lookup', methods=['GET'])
+@verify_firebase_token
+def lookup():
+    return lookup_by_domain()
+
+@vault_bp.route('/batch-get', methods=['POST'])
+@verify_firebase_token
+def batch_read():
+    return batch_get()
+
 @vault_bp.route('/<entry_id>', methods=['GET'])
 @verify_firebase_token
 def get_one(entry_id):
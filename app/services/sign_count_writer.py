@@ -0,0 +1,119 @@
+import atexit
+import os
+import threading
+from datetime import datetime, timezone
+from firebase_admin import firestore
+from app.extensions.firestore import FirestoreClient
+from app.extensions.log import get_logger
+
+log = get_logger(__name__)
+
+
+class SignCountWriter:
+    """
+    Write-behind queue for passkey sign counts and last-used times.
+
+    Logins enqueue and return immediately; a background thread flushes batches
+    to Firestore. Pending updates are coalesced per credential, keeping the
+    highest sign count, and each flush writes max(stored, pending) inside a
+    transaction, so late or out-of-order flushes never lower a counter.
+    """
+
+    def __init__(self, max_pending=10000, flush_interval=1.0, batch_size=200):
+        self.max_pending = max_pending
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._cond = threading.Condition()
+        self._pending = {}  # (user_id, cred_id) -> (sign_count, last_used_at)
+        self._thread = None
+        self._pid = None
+        atexit.register(self.flush)
+
+    def enqueue(self, user_id, cred_id, sign_count, last_used_at=None):
+        """Queue an update. Returns False if the queue is full so the caller can write synchronously."""
+        last_used_at = last_used_at or datetime.now(timezone.utc)
+        with self._cond:
+            key = (user_id, cred_id)
+            if key not in self._pending and len(self._pending) >= self.max_pending:
+                return False
+            self._merge(key, sign_count, last_used_at)
+            if len(self._pending) >= self.batch_size:
+                self._cond.notify()
+        self._ensure_thread()
+        return True
+
+    def flush(self):
+        """Write everything pending now (used at shutdown). Failed batches are not retried here."""
+        with self._cond:
+            rounds = len(self._pending) // self.batch_size + 1
+        for _ in range(rounds):
+            batch = self._take_batch()
+            if not batch:
+                return
+            self._write(batch)
+
+    def _merge(self, key, sign_count, last_used_at):
+        current = self._pending.get(key)
+        if current:
+            sign_count = max(sign_count, current[0])
+            last_used_at = max(last_used_at, current[1])
+        self._pending[key] = (sign_count, last_used_at)
+
+    def _ensure_thread(self):
+        # Threads don't survive fork, so each gunicorn worker starts its own
+        pid = os.getpid()
+        if self._thread is not None and self._pid == pid and self._thread.is_alive():
+            return
+        with self._cond:
+            if self._thread is not None and self._pid == pid and self._thread.is_alive():
+                return
+            self._pid = pid
+            self._thread = threading.Thread(target=self._run, name='sign-count-writer', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait(timeout=self.flush_interval)
+            batch = self._take_batch()
+            if batch:
+                self._write(batch)
+
+    def _take_batch(self):
+        with self._cond:
+            keys = list(self._pending)[:self.batch_size]
+            return {key: self._pending.pop(key) for key in keys}
+
+    def _write(self, batch):
+        db = FirestoreClient.get_db()
+        try:
+            if not db:
+                raise Exception("Firestore not initialized")
+            refs = {
+                key: FirestoreClient.collection(f"users/{key[0]}/webauthn_credentials").document(key[1])
+                for key in batch
+            }
+            _apply_sign_counts(db.transaction(), refs, batch)
+        except Exception as e:
+            log.error("Error flushing %d sign count updates, will retry: %s", len(batch), e)
+            with self._cond:
+                for key, (sign_count, last_used_at) in batch.items():
+                    self._merge(key, sign_count, last_used_at)
+
+
+@firestore.transactional
+def _apply_sign_counts(transaction, refs, batch):
+    stored = {snap.reference.path: snap for snap in transaction.get_all(list(refs.values()))}
+    for key, ref in refs.items():
+        snap = stored.get(ref.path)
+        if snap is None or not snap.exists:
+            # Credential was deleted meanwhile; don't resurrect it
+            continue
+        sign_count, last_used_at = batch[key]
+        transaction.set(ref, {
+            'sign_count': max(sign_count, (snap.to_dict() or {}).get('sign_count', 0)),
+            'last_used_at': last_used_at,
+        }, merge=True)
+
+
+sign_count_writer = SignCountWriter()
@@ -0,0 +1,62 @@
+import ipaddress
+from urllib.parse import urlsplit
+
+# Normalised registrable domain ("eTLD+1") for a vault entry's site, so
+# autofill can find entries for accounts.example.co.uk by "example.co.uk".
+# The value is stored in Firestore and queried by equality, so it must come out
+# the same on every instance: a fixed built-in list of common multi-label
+# suffixes is used rather than a Public Suffix List that varies by install.
+
+_COMMON_MULTI_LABEL_SUFFIXES = {
+    'co.uk', 'org.uk', 'ac.uk', 'gov.uk', 'me.uk', 'ltd.uk', 'plc.uk',
+    'com.au', 'net.au', 'org.au', 'edu.au', 'gov.au',
+    'co.nz', 'org.nz', 'govt.nz',
+    'co.jp', 'ne.jp', 'or.jp', 'ac.jp',
+    'co.kr', 'or.kr',
+    'com.br', 'net.br', 'org.br', 'gov.br',
+    'com.cn', 'net.cn', 'org.cn', 'gov.cn',
+    'com.mx', 'com.ar', 'com.tr', 'com.tw', 'com.hk', 'com.sg', 'com.my',
+    'co.in', 'net.in', 'org.in', 'gov.in',
+    'co.za', 'org.za', 'co.il', 'co.id', 'co.th',
+    'github.io', 'gitlab.io', 'herokuapp.com', 'vercel.app', 'netlify.app',
+    'onrender.com', 'pages.dev', 'web.app', 'firebaseapp.com', 'appspot.com',
+}
+
+
+def _hostname(site):
+    site = site.strip().lower()
+    if '//' not in site:
+        site = '//' + site
+    try:
+        host = urlsplit(site).hostname or ''
+    except ValueError:
+        return ''
+    host = host.rstrip('.')
+    try:
+        # Store internationalised names in their ASCII (punycode) form
+        return host.encode('idna').decode('ascii')
+    except UnicodeError:
+        return host
+
+
+def registrable_domain(site):
+    """
+    'https://Login.Example.co.uk:8443/path' -> 'example.co.uk'.
+    IP addresses and single-label hosts (localhost) are returned as-is;
+    returns '' when no host can be parsed.
+    """
+    host = _hostname(str(site or ''))
+    if not host:
+        return ''
+    try:
+        ipaddress.ip_address(host.strip('[]'))
+        return host
+    except ValueError:
+        pass
+
+    labels = [label for label in host.split('.') if label]
+    if len(labels) <= 2:
+        return host
+    if '.'.join(labels[-2:]) in _COMMON_MULTI_LABEL_SUFFIXES:
+        return '.'.join(labels[-3:])
+    return '.'.join(labels[-2:])
@@ -0,0 +1,108 @@
+import base64
+import json
+import threading
+import time
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import padding
+
+# Audience Firebase expects on custom tokens minted by a service account
+CUSTOM_TOKEN_AUDIENCE = "https://identitytoolkit.googleapis.com/google.identity.identitytoolkit.v1.IdentityToolkit"
+CUSTOM_TOKEN_LIFETIME = 3600
+
+
+def _b64url(data):
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode('ascii')
+
+
+class TokenMinter:
+    """
+    Mints Firebase custom tokens with a private key parsed once at startup,
+    instead of going through firebase_admin.auth.create_custom_token on every login.
+    Optionally hands back a recently minted token for the same uid.
+    """
+
+    def __init__(self):
+        self._key = None
+        self._client_email = None
+        self.reuse_seconds = 0
+        self._lock = threading.Lock()
+        self._recent = {}  # uid -> (token, minted_at)
+        self.minted = 0
+        self.reused = 0
+        self.sign_seconds_total = 0.0
+        self.sign_seconds_max = 0.0
+
+    def configure(self, private_key_pem, client_email, reuse_seconds=0):
+        self._key = serialization.load_pem_private_key(private_key_pem.encode('utf-8'), password=None)
+        self._client_email = client_email
+        self.reuse_seconds = reuse_seconds
+
+    @property
+    def ready(self):
+        return self._key is not None
+
+    def mint(self, uid):
+        if not self.ready:
+            # LAZY_INIT: the key is loaded by the first Admin SDK init
+            from app.extensions.firebase import ensure_firebase
+            ensure_firebase()
+        if not self.ready:
+            # Key wasn't loaded (e.g. init failed); use the SDK path
+            from firebase_admin import auth
+            token = auth.create_custom_token(uid)
+            return token.decode('utf-8') if isinstance(token, bytes) else token
+
+        now = time.time()
+        if self.reuse_seconds:
+            with self._lock:
+                recent = self._recent.get(uid)
+                if recent and now - recent[1] < self.reuse_seconds:
+                    self.reused += 1
+                    return recent[0]
+
+        token = self._sign(uid, int(now))
+
+        with self._lock:
+            if self.reuse_seconds:
+                if len(self._recent) >= 10000:
+                    self._recent.clear()
+                self._recent[uid] = (token, now)
+        return token
+
+    def _sign(self, uid, now):
+        header = {"alg": "RS256", "typ": "JWT"}
+        payload = {
+            "iss": self._client_email,
+            "sub": self._client_email,
+            "aud": CUSTOM_TOKEN_AUDIENCE,
+            "iat": now,
+            "exp": now + CUSTOM_TOKEN_LIFETIME,
+            "uid": uid,
+        }
+        signing_input = (
+            _b64url(json.dumps(header, separators=(',', ':')).encode('utf-8')) + '.' +
+            _b64url(json.dumps(payload, separators=(',', ':')).encode('utf-8'))
+        )
+
+        start = time.perf_counter()
+        signature = self._key.sign(signing_input.encode('ascii'), padding.PKCS1v15(), hashes.SHA256())
+        elapsed = time.perf_counter() - start
+
+        with self._lock:
+            self.minted += 1
+            self.sign_seconds_total += elapsed
+            self.sign_seconds_max = max(self.sign_seconds_max, elapsed)
+        return signing_input + '.' + _b64url(signature)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'minted': self.minted,
+                'reused': self.reused,
+                'sign_seconds_total': self.sign_seconds_total,
+                'sign_seconds_avg': self.sign_seconds_total / self.minted if self.minted else 0.0,
+                'sign_seconds_max': self.sign_seconds_max,
+            }
+
+
+token_minter = TokenMinter()
@@ -0,0 +1,121 @@
+import hashlib
+import hmac
+import threading
+import time
+from collections import OrderedDict
+import pyotp
+from app.extensions.log import get_logger
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+log = get_logger(__name__)
+
+
+class TOTPEngine:
+    """
+    TOTP verification with replay protection.
+
+    Valid codes for the current window (now +/- valid_window steps) are computed
+    once per secret per time step and reused across requests. Codes are compared
+    in constant time, and each accepted (uid, timestep) is recorded so the same
+    code (or an older one) can't be used twice.
+    """
+
+    REPLAY_PREFIX = 'totp_used:'
+
+    def __init__(self, interval=30, valid_window=1, max_secrets=10000, replay_url=None):
+        self.interval = interval
+        self.valid_window = valid_window
+        self.max_secrets = max_secrets
+        self._lock = threading.Lock()
+        self._codes = OrderedDict()  # (secret digest, timestep) -> ((step, code), ...)
+        self._last_used = {}         # uid -> highest accepted timestep
+        self._replay = None
+        if replay_url:
+            if redis is None:
+                raise ImportError("The 'redis' package is required for TOTP_REPLAY_URL")
+            self._replay = redis.Redis.from_url(replay_url, socket_timeout=0.5)
+
+    def _window_codes(self, secret, timestep):
+        key = (hashlib.sha256(secret.encode('utf-8')).digest(), timestep)
+        with self._lock:
+            codes = self._codes.get(key)
+            if codes is not None:
+                self._codes.move_to_end(key)
+                return codes
+
+        totp = pyotp.TOTP(secret, interval=self.interval)
+        codes = tuple(
+            (step, totp.generate_otp(step))
+            for step in range(timestep - self.valid_window, timestep + self.valid_window + 1)
+        )
+        with self._lock:
+            self._codes[key] = codes
+            while len(self._codes) > self.max_secrets:
+                self._codes.popitem(last=False)
+        return codes
+
+    def _match(self, secret, code, now):
+        """Return the matching timestep or None. Compares every candidate to keep timing flat."""
+        code = str(code).strip()
+        # compare_digest rejects non-ASCII str; no such code can match anyway
+        if not (code.isascii() and code.isdigit()):
+            return None
+        matched = None
+        for step, candidate in self._window_codes(secret, int(now // self.interval)):
+            if hmac.compare_digest(candidate, code) and matched is None:
+                matched = step
+        return matched
+
+    def _consume(self, uid, step):
+        """Record (uid, step). False if this step (or a later one) was already used."""
+        # Local check first: covers the common single-worker case without a network call
+        with self._lock:
+            if self._last_used.get(uid, -1) >= step:
+                return False
+            self._last_used[uid] = step
+            self._prune(step)
+
+        if self._replay is not None:
+            # Shared across workers; expires once the code can no longer be valid
+            ttl = self.interval * (2 * self.valid_window + 2)
+            try:
+                if not self._replay.set(f"{self.REPLAY_PREFIX}{uid}:{step}", 1, nx=True, ex=ttl):
+                    return False
+            except redis.RedisError as e:
+                log.warning("TOTP replay check failed: %s", e)
+        return True
+
+    def _prune(self, step):
+        # Entries older than the window can't block anything any more
+        if len(self._last_used) > self.max_secrets:
+            horizon = step - 2 * self.valid_window - 1
+            self._last_used = {u: s for u, s in self._last_used.items() if s >= horizon}
+
+    def verify(self, uid, secret, code, now=None):
+        now = time.time() if now is None else now
+        step = self._match(secret, code, now)
+        if step is None:
+            return False
+        return self._consume(uid, step)
+
+    def verify_many(self, attempts, now=None):
+        """Verify [(uid, secret, code), ...] against one clock reading (used by load tests)."""
+        now = time.time() if now is None else now
+        return [self.verify(uid, secret, code, now) for uid, secret, code in attempts]
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_totp_engine(config):
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = TOTPEngine(replay_url=config.get('TOTP_REPLAY_URL'))
+    return _engine
@@ -0,0 +1,99 @@
+import threading
+import time
+from app.extensions.log import get_logger
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+log = get_logger(__name__)
+
+
+class TwoFactorCache:
+    """
+    Short-lived per-user cache of {'enabled', 'secret'} so 2FA status checks
+    don't read users/{uid} from Firestore on every app open.
+
+    enable_2fa/disable_2fa invalidate the entry in this process. When a shared
+    version store (Redis) is configured they also bump a per-user version, and
+    other processes drop cached entries whose version no longer matches.
+
+    Without a shared store other processes never hear about enable_2fa, so a
+    cached 'disabled' state is not served: it would let the login gate skip
+    the second factor. A stale 'enabled' state only costs a re-read.
+    """
+
+    VERSION_PREFIX = '2fa_version:'
+
+    def __init__(self, ttl=60, max_users=10000, version_url=None):
+        self.ttl = ttl
+        self.max_users = max_users
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries = {}  # uid -> (state, version, expires_at)
+        self._versions = None
+        if version_url:
+            if redis is None:
+                raise ImportError("The 'redis' package is required for TWO_FACTOR_CACHE_URL")
+            self._versions = redis.Redis.from_url(version_url, socket_timeout=0.5)
+
+    def _current_version(self, uid):
+        if self._versions is None:
+            return None
+        try:
+            return self._versions.get(self.VERSION_PREFIX + uid)
+        except redis.RedisError as e:
+            log.warning("2FA version check failed: %s", e)
+            return False  # Unknown: never matches, forces a fresh read
+
+    def get(self, uid):
+        with self._lock:
+            entry = self._entries.get(uid)
+        if entry is None or time.time() >= entry[2]:
+            self.misses += 1
+            return None
+        if self._versions is not None and entry[1] != self._current_version(uid):
+            self.invalidate(uid, bump=False)
+            self.misses += 1
+            return None
+        if not entry[0]['enabled'] and self._versions is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry[0]
+
+    def set(self, uid, state):
+        version = self._current_version(uid)
+        if version is False:
+            return
+        with self._lock:
+            if len(self._entries) >= self.max_users:
+                self._entries.clear()
+            self._entries[uid] = (state, version, time.time() + self.ttl)
+
+    def invalidate(self, uid, bump=True):
+        with self._lock:
+            self._entries.pop(uid, None)
+        if bump and self._versions is not None:
+            try:
+                self._versions.incr(self.VERSION_PREFIX + uid)
+            except redis.RedisError as e:
+                log.warning("2FA version bump failed: %s", e)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_two_factor_cache(config):
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = TwoFactorCache(
+                    ttl=config.get('TWO_FACTOR_CACHE_TTL', 60),
+                    version_url=config.get('TWO_FACTOR_CACHE_URL'),
+                )
+    return _cache
@@ -0,0 +1,97 @@
+import json
+from flask import current_app, jsonify
+from app.extensions.metrics import timed
+from app.services.site_domain import registrable_domain
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Vault entry <-> Firestore REST document conversion, shared by every vault route.
+
+# Fields a client may read or write on a vault entry
+VAULT_FIELDS = ('site', 'username', 'encryptedPassword', 'iv')
+
+# Derived from 'site' on every write; indexed for /api/vault/lookup
+DOMAIN_FIELD = 'domain'
+
+
+def decode_value(value):
+    """Convert one Firestore typed value ({"stringValue": ...}) to plain Python."""
+    if 'stringValue' in value:
+        return value['stringValue']
+    if 'timestampValue' in value:
+        return value['timestampValue']
+    if 'booleanValue' in value:
+        return value['booleanValue']
+    if 'integerValue' in value:
+        # int64 values are sent as strings
+        return int(value['integerValue'])
+    if 'doubleValue' in value:
+        return float(value['doubleValue'])
+    if 'mapValue' in value:
+        return decode_fields(value['mapValue'].get('fields', {}))
+    if 'arrayValue' in value:
+        return [decode_value(v) for v in value['arrayValue'].get('values', [])]
+    if 'bytesValue' in value:
+        return value['bytesValue']
+    if 'referenceValue' in value:
+        return value['referenceValue']
+    if 'geoPointValue' in value:
+        return value['geoPointValue']
+    return None  # nullValue
+
+
+def decode_fields(fields):
+    return {name: decode_value(value) for name, value in fields.items()}
+
+
+def document_to_item(doc, mask=None):
+    """Firestore REST document -> API item; missing fields come back as ''."""
+    fields = doc.get('fields', {})
+    item = {'id': doc['name'].rsplit('/', 1)[-1]}
+    for name in mask or VAULT_FIELDS:
+        value = fields.get(name)
+        item[name] = '' if value is None else decode_value(value)
+    return item
+
+
+def entry_fields(data):
+    """Firestore fields for a create/update; timestamps are set by server_timestamps."""
+    fields = {name: {"stringValue": data[name]} for name in VAULT_FIELDS}
+    fields[DOMAIN_FIELD] = {"stringValue": registrable_domain(data['site'])}
+    return fields
+
+
+def server_timestamps(*field_paths):
+    """
+    Write.updateTransforms setting each field to the commit time.
+    /changes pages by these timestamps, so they must come from Firestore: an app
+    server's clock (taken before the call, and skewed between hosts) can stamp a
+    write below a cursor another device has already passed.
+    """
+    return [{"fieldPath": path, "setToServerValue": "REQUEST_TIME"} for path in field_paths]
+
+
+def entry_write(name, data, created=False):
+    """Firestore Write for a create/update; createdAt is only set on create."""
+    timestamps = ('updatedAt', 'createdAt') if created else ('updatedAt',)
+    return {
+        "update": {"name": name, "fields": entry_fields(data)},
+        "updateTransforms": server_timestamps(*timestamps),
+    }
+
+
+def dumps(obj):
+    # orjson is several times faster than json for large listings
+    if orjson is not None:
+        return orjson.dumps(obj).decode('utf-8')
+    return json.dumps(obj, separators=(',', ':'))
+
+
+def json_response(obj, status=200):
+    with timed('serialize'):
+        if orjson is None:
+            return jsonify(obj), status
+        return current_app.response_class(orjson.dumps(obj), mimetype='application/json'), status
@@ -7,6 +7,8 @@ from webauthn import (
     verify_authentication_response,
 )
 import sys
+import threading
+import time
 from webauthn.helpers import (
     bytes_to_base64url,
     parse_registration_credential_json,
@@ -21,10 +23,99 @@ from webauthn.helpers.structs import (
     AuthenticationCredential,
     AttestationConveyancePreference,
     AuthenticatorAttachment,
+    AuthenticatorTransport,
+    PublicKeyCredentialDescriptor,
 )
 from flask import current_app, request
 from datetime import datetime, timezone
-from app.extensions.firestore import FirestoreClient, store_challenge, get_challenge
+from app.extensions.firestore import FirestoreClient
+from app.extensions.challenge_store import store_challenge, get_challenge
+from app.services.sign_count_writer import sign_count_writer
+from app.extensions.metrics import timed
+
+class CredentialCache:
+    """
+    Per-process index of each user's passkeys: {cred_id: {public_key, transports, sign_count}}.
+    Loaded once per user and kept up to date by write-through on register/login.
+    Entries expire after `ttl` seconds so changes made by other workers are picked up.
+    """
+
+    def __init__(self, ttl=300, max_users=10000):
+        self.ttl = ttl
+        self.max_users = max_users
+        self._lock = threading.Lock()
+        self._users = {}  # uid -> (credentials, expires_at)
+
+    @staticmethod
+    def _collection(user_id):
+        return f"users/{user_id}/webauthn_credentials"
+
+    def get_all(self, user_id):
+        """Return a snapshot of the user's index; update_local mutates the cached dict."""
+        with self._lock:
+            entry = self._users.get(user_id)
+            if entry and time.time() < entry[1]:
+                return dict(entry[0])
+
+        docs = FirestoreClient.list_docs(self._collection(user_id))
+        if docs is None:
+            # Firestore unavailable: don't cache the failure
+            return {}
+        credentials = {cid: self._index_entry(doc) for cid, doc in docs.items() if 'public_key' in doc}
+        with self._lock:
+            if len(self._users) >= self.max_users:
+                self._users.clear()
+            self._users[user_id] = (credentials, time.time() + self.ttl)
+            return dict(credentials)
+
+    def get(self, user_id, cred_id):
+        credential = self.get_all(user_id).get(cred_id)
+        if credential is None:
+            # Possibly registered through another worker since we loaded the index
+            doc = FirestoreClient.get_doc(self._collection(user_id), cred_id)
+            if doc and 'public_key' in doc:
+                credential = self._index_entry(doc)
+                self.update_local(user_id, cred_id, doc)
+        return credential
+
+    def put(self, user_id, cred_id, data):
+        """Write-through: persist to Firestore, then update the cached index."""
+        if not FirestoreClient.update_doc(self._collection(user_id), cred_id, data):
+            return False
+        self.update_local(user_id, cred_id, data)
+        return True
+
+    def update_local(self, user_id, cred_id, data):
+        """Update the cached index only (e.g. when persistence is deferred)."""
+        # Only users whose index is already loaded are updated; others load on next use
+        with self._lock:
+            entry = self._users.get(user_id)
+            if entry:
+                current = entry[0].get(cred_id, {})
+                entry[0][cred_id] = self._index_entry(data, current)
+
+    @staticmethod
+    def _index_entry(doc, defaults=None):
+        defaults = defaults or {}
+        return {
+            'public_key': doc.get('public_key', defaults.get('public_key')),
+            'transports': doc.get('transports', defaults.get('transports', [])),
+            'sign_count': doc.get('sign_count', defaults.get('sign_count', 0)),
+        }
+
+
+credential_cache = CredentialCache()
+
+
+def _transports(values):
+    transports = []
+    for value in values or []:
+        try:
+            transports.append(AuthenticatorTransport(value))
+        except ValueError:
+            pass
+    return transports
+
 
 class WebAuthnService:
     @staticmethod
@@ -86,13 +177,14 @@ class WebAuthnService:
         try:
             credential = parse_registration_credential_json(response_body)
             
-            verification = verify_registration_response(
-                credential=credential,
-                expected_challenge=expected_challenge,
-                expected_origin=config['origin'],
-                expected_rp_id=config['rp_id'],
-                require_user_verification=True,
-            )
+            with timed('webauthn_verify', ceremony='registration'):
+                verification = verify_registration_response(
+                    credential=credential,
+                    expected_challenge=expected_challenge,
+                    expected_origin=config['origin'],
+                    expected_rp_id=config['rp_id'],
+                    require_user_verification=True,
+                )
             
             cred_id = bytes_to_base64url(verification.credential_id)
             new_cred = {
@@ -103,8 +195,8 @@ class WebAuthnService:
                  "created_at": str(datetime.now(timezone.utc))
             }
             
-            # Store credential in subcollection
-            FirestoreClient.update_doc(f"users/{user_id}/webauthn_credentials", cred_id, new_cred)
+            # Store credential in subcollection (and the cached index)
+            credential_cache.put(user_id, cred_id, new_cred)
             
             return {
                 'verified': True,
@@ -115,16 +207,24 @@ class WebAuthnService:
             raise e
 
     @staticmethod
-    def generate_login_options(user_id=None):
+    def generate_login_options(user_id=None, authenticated=False):
         config = WebAuthnService._get_config()
         
-        # If user_id provided, we COULD look up their credentials to provide allowCredentials.
-        # But for simplicity/speed, we often use empty allowCredentials (usernameless flow support) 
-        # or rely on client to select.
+        # For a caller whose identity is proven (valid ID token), list their passkeys in
+        # allowCredentials so the browser can go straight to the right authenticator.
+        # A uid merely claimed in the request body gets the same response as any other
+        # uid (empty allowCredentials, usernameless flow): listing credential IDs there
+        # would let anyone enumerate accounts and passkeys.
+        allow_credentials = None
+        if user_id and authenticated:
+            allow_credentials = [
+                PublicKeyCredentialDescriptor(id=base64url_to_bytes(cid), transports=_transports(cred['transports']))
+                for cid, cred in credential_cache.get_all(user_id).items()
+            ] or None
         
         options = generate_authentication_options(
             rp_id=config['rp_id'],
-            allow_credentials=None,
+            allow_credentials=allow_credentials,
             user_verification=UserVerificationRequirement.PREFERRED,
         )
         
@@ -150,31 +250,37 @@ class WebAuthnService:
         except Exception as e:
             raise ValueError(f"Failed to parse credential: {str(e)}")
 
-        # 3. Get User's Public Key from Firestore
+        # 3. Get User's Public Key (cached index, Firestore on miss)
         cred_id = credential.id
-        cred_doc = FirestoreClient.get_doc(f"users/{user_id}/webauthn_credentials", cred_id)
+        cred_doc = credential_cache.get(user_id, cred_id)
         
-        if not cred_doc or 'public_key' not in cred_doc:
+        if not cred_doc or not cred_doc.get('public_key'):
             raise ValueError("Credential not registered for this user")
             
         public_key = base64url_to_bytes(cred_doc['public_key'])
         current_sign_count = cred_doc.get('sign_count', 0)
 
         # 4. Verify
-        verification = verify_authentication_response(
-            credential=credential,
-            expected_challenge=expected_challenge,
-            expected_rp_id=config['rp_id'],
-            expected_origin=config['origin'],
-            credential_public_key=public_key,
-            credential_current_sign_count=current_sign_count,
-            require_user_verification=True,
-        )
+        with timed('webauthn_verify', ceremony='login'):
+            verification = verify_authentication_response(
+                credential=credential,
+                expected_challenge=expected_challenge,
+                expected_rp_id=config['rp_id'],
+                expected_origin=config['origin'],
+                credential_public_key=public_key,
+                credential_current_sign_count=current_sign_count,
+                require_user_verification=True,
+            )
         
         # 5. Update Sign Count
-        FirestoreClient.update_doc(f"users/{user_id}/webauthn_credentials", cred_id, {
-            "sign_count": verification.new_sign_count
-        })
+        # Deferred by default: the write-behind queue persists it off the request path
+        # and never lowers a stored counter. Falls back to a direct write if the queue is full.
+        update = {"sign_count": verification.new_sign_count}
+        if current_app.config.get('SIGN_COUNT_WRITE_BEHIND') and \
+                sign_count_writer.enqueue(user_id, cred_id, verification.new_sign_count):
+            credential_cache.update_local(user_id, cred_id, update)
+        else:
+            credential_cache.put(user_id, cred_id, update)
 
         return {
             'verified': True,
@@ -0,0 +1,187 @@
+"""
+Offline load test: drives the Flask app (in-process, via the test client)
+against the local Firestore/Identity Toolkit stub and reports req/s and
+p50/p95/p99 per scenario.
+
+    python benchmarks/run_benchmark.py --requests 500 --concurrency 16 --latency-ms 30
+    python benchmarks/run_benchmark.py --scenarios vault_list --vault-sizes 10 1000 5000
+
+WebAuthn verification needs a real authenticator, so only the options half of
+the ceremonies is measured here.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import pyotp
+from stub_server import start_stub_server, make_stub_token
+from app.app import create_app
+from app.config import Config
+
+PROJECT_ID = 'bench-project'
+DOC_ROOT = f'projects/{PROJECT_ID}/databases/(default)/documents'
+ENTRY = {'site': 'example.com', 'username': 'bench', 'encryptedPassword': 'x' * 64, 'iv': 'y' * 24}
+
+
+def make_config(stub_url, token_cache):
+    class BenchConfig(Config):
+        TESTING = True
+        FIREBASE_PROJECT_ID = PROJECT_ID
+        FIREBASE_API_KEY = 'bench'
+        FIRESTORE_BASE_URL = stub_url
+        IDENTITY_TOOLKIT_BASE_URL = stub_url
+        FIREBASE_TOKEN_VERIFICATION = 'rest'
+        TOKEN_CACHE_ENABLED = token_cache
+        CHALLENGE_STORE = 'memory'
+        RATELIMIT_ENABLED = False
+    return BenchConfig
+
+
+def seed_entry(state, uid, i):
+    fields = {k: {'stringValue': v} for k, v in ENTRY.items()}
+    fields['domain'] = {'stringValue': ENTRY['site']}
+    fields['updatedAt'] = {'timestampValue': '2024-01-01T00:00:00Z'}
+    return state.put(f'{DOC_ROOT}/users/{uid}/vault/entry{i:06d}', fields)
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100.0 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def run_scenario(app, name, make_request, total, concurrency):
+    """make_request(client, i) -> response. Returns a result row."""
+    latencies = []
+    errors = 0
+    lock = threading.Lock()
+    local = threading.local()
+
+    def one(i):
+        nonlocal errors
+        client = getattr(local, 'client', None)
+        if client is None:
+            client = local.client = app.test_client()
+        start = time.perf_counter()
+        response = make_request(client, i)
+        elapsed = time.perf_counter() - start
+        with lock:
+            latencies.append(elapsed)
+            if response.status_code >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(total)))
+    wall = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'scenario': name,
+        'requests': total,
+        'errors': errors,
+        'req_per_s': total / wall if wall else 0.0,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p95_ms': percentile(latencies, 95) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+        'mean_ms': statistics.fmean(latencies) * 1000 if latencies else 0.0,
+    }
+
+
+def build_scenarios(state, args):
+    uid = 'bench-user'
+    headers = {'Authorization': f'Bearer {make_stub_token(uid)}'}
+    seeded = [seed_entry(state, uid, i)['name'].rsplit('/', 1)[-1] for i in range(args.requests)]
+
+    scenarios = {
+        'vault_create': lambda c, i: c.post('/api/vault', json=ENTRY, headers=headers),
+        'vault_get': lambda c, i: c.get(f'/api/vault/{seeded[i % len(seeded)]}', headers=headers),
+        'vault_update': lambda c, i: c.put(f'/api/vault/{seeded[i % len(seeded)]}', json=ENTRY, headers=headers),
+    }
+
+    for size in args.vault_sizes:
+        list_uid = f'bench-list-{size}'
+        for i in range(size):
+            seed_entry(state, list_uid, i)
+        list_headers = {'Authorization': f'Bearer {make_stub_token(list_uid)}'}
+        scenarios[f'vault_list_{size}'] = (lambda h: lambda c, i: c.get('/api/vault', headers=h))(list_headers)
+        # Autofill: the same vault, but only entries for one site
+        scenarios[f'vault_lookup_{size}'] = (lambda h: lambda c, i: c.get(
+            '/api/vault/lookup', query_string={'domain': 'https://login.example.com/'}, headers=h))(list_headers)
+
+    # One user per request: TOTP replay protection rejects a second use of the same code
+    totp_users = []
+    for i in range(args.requests):
+        secret = pyotp.random_base32()
+        totp_uid = f'bench-2fa-{i}'
+        state.put(f'{DOC_ROOT}/users/{totp_uid}', {
+            'twoFactorEnabled': {'booleanValue': True},
+            'twoFactorSecret': {'stringValue': secret},
+        })
+        totp_users.append((totp_uid, secret))
+
+    def totp_verify(c, i):
+        totp_uid, secret = totp_users[i % len(totp_users)]
+        return c.post('/api/auth/2fa/verify', json={'code': pyotp.TOTP(secret).now()},
+                      headers={'Authorization': f'Bearer {make_stub_token(totp_uid)}'})
+    scenarios['2fa_verify'] = totp_verify
+
+    scenarios['webauthn_register_options'] = lambda c, i: c.post(
+        '/api/auth/webauthn/register/options', headers=headers, json={},
+        environ_overrides={'HTTP_ORIGIN': 'http://localhost:5173'})
+    scenarios['webauthn_login_options'] = lambda c, i: c.post('/api/auth/webauthn/login/options', json={})
+
+    # Last, so the other scenarios still find their entries
+    scenarios['vault_delete'] = lambda c, i: c.delete(f'/api/vault/{seeded[i % len(seeded)]}', headers=headers)
+    return scenarios
+
+
+def print_table(rows):
+    header = f"{'scenario':<28}{'reqs':>7}{'errs':>6}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+    print(header)
+    print('-' * len(header))
+    for r in rows:
+        print(f"{r['scenario']:<28}{r['requests']:>7}{r['errors']:>6}{r['req_per_s']:>10.1f}"
+              f"{r['p50_ms']:>10.2f}{r['p95_ms']:>10.2f}{r['p99_ms']:>10.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=200, help='Requests per scenario')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--latency-ms', type=float, default=20, help='Injected upstream latency')
+    parser.add_argument('--vault-sizes', type=int, nargs='+', default=[10, 100, 1000])
+    parser.add_argument('--scenarios', nargs='+', help='Only run scenarios whose name starts with one of these')
+    parser.add_argument('--no-token-cache', action='store_true', help='Re-verify the token on every request')
+    parser.add_argument('--json', metavar='PATH', help='Also write results as JSON (for regression tracking)')
+    args = parser.parse_args()
+
+    server, stub_url = start_stub_server(latency_ms=args.latency_ms)
+    app = create_app(make_config(stub_url, token_cache=not args.no_token_cache))
+    scenarios = build_scenarios(server.RequestHandlerClass.state, args)
+
+    rows = []
+    for name, make_request in scenarios.items():
+        if args.scenarios and not any(name.startswith(prefix) for prefix in args.scenarios):
+            continue
+        rows.append(run_scenario(app, name, make_request, args.requests, args.concurrency))
+
+    print(f"upstream latency {args.latency_ms} ms, concurrency {args.concurrency}\n")
+    print_table(rows)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'args': vars(args), 'results': rows}, f, indent=2)
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,165 @@
+"""
+Cold-start benchmark for the serverless entry point (api/index.py).
+
+Each sample is a fresh interpreter that imports api.index and serves its first
+requests (/health, then an authenticated vault list against the local stub),
+run once with eager init and once with LAZY_INIT.
+
+    python benchmarks/startup_benchmark.py run --samples 10 --json startup.json
+    python benchmarks/startup_benchmark.py profile --top 25
+
+'profile' runs the import under -X importtime and reports where startup time
+goes, grouped by top-level package.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from stub_server import start_stub_server, make_stub_token
+
+PROJECT_ID = 'bench-project'
+
+# Runs in the child interpreter; prints one JSON line of timings in ms
+CHILD = r"""
+import json, os, time
+t0 = time.perf_counter()
+from api.index import app
+t1 = time.perf_counter()
+client = app.test_client()
+health = client.get('/health')
+t2 = time.perf_counter()
+vault = client.get('/api/vault', headers={'Authorization': 'Bearer ' + os.environ['BENCH_TOKEN']})
+t3 = time.perf_counter()
+print(json.dumps({
+    'import_ms': (t1 - t0) * 1000,
+    'first_health_ms': (t2 - t1) * 1000,
+    'first_vault_ms': (t3 - t2) * 1000,
+    'ready_ms': (t2 - t0) * 1000,
+    'status': [health.status_code, vault.status_code],
+}))
+"""
+
+
+def _throwaway_private_key():
+    # A real PEM so eager init pays its actual credential-parsing cost
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import rsa
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    return key.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+    ).decode('ascii')
+
+
+def child_env(stub_url, lazy):
+    env = dict(os.environ)
+    env.update({
+        'PYTHONPATH': ROOT,
+        'FIREBASE_PROJECT_ID': PROJECT_ID,
+        'FIREBASE_CLIENT_EMAIL': f'bench@{PROJECT_ID}.iam.gserviceaccount.com',
+        'FIREBASE_PRIVATE_KEY': _throwaway_private_key(),
+        'FIREBASE_API_KEY': 'bench',
+        'FIRESTORE_BASE_URL': stub_url,
+        'IDENTITY_TOOLKIT_BASE_URL': stub_url,
+        'FIREBASE_TOKEN_VERIFICATION': 'rest',
+        'LOG_LEVEL': 'WARNING',
+        'LAZY_INIT': 'true' if lazy else 'false',
+        'BENCH_TOKEN': make_stub_token('bench-startup'),
+    })
+    env.pop('VERCEL', None)
+    return env
+
+
+def sample(env):
+    out = subprocess.run([sys.executable, '-c', CHILD], env=env, cwd=ROOT,
+                         capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def summarize(samples):
+    row = {}
+    for key in ('import_ms', 'first_health_ms', 'ready_ms', 'first_vault_ms'):
+        values = sorted(s[key] for s in samples)
+        row[key] = {'median': statistics.median(values), 'max': values[-1]}
+    row['errors'] = sum(1 for s in samples if any(code >= 400 for code in s['status']))
+    return row
+
+
+def cmd_run(args):
+    server, stub_url = start_stub_server()
+    results = {}
+    for mode, lazy in (('eager', False), ('lazy', True)):
+        env = child_env(stub_url, lazy)
+        results[mode] = summarize([sample(env) for _ in range(args.samples)])
+    server.shutdown()
+
+    header = f"{'mode':<8}{'import':>10}{'/health':>10}{'ready':>10}{'1st vault':>11}{'errs':>6}   (median ms)"
+    print(header)
+    print('-' * len(header))
+    for mode, row in results.items():
+        print(f"{mode:<8}{row['import_ms']['median']:>10.1f}{row['first_health_ms']['median']:>10.1f}"
+              f"{row['ready_ms']['median']:>10.1f}{row['first_vault_ms']['median']:>11.1f}{row['errors']:>6}")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'samples': args.samples, 'results': results}, f, indent=2)
+
+
+def parse_importtime(stderr):
+    """Yield (module, self_us, cumulative_us, depth) from -X importtime output."""
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|', 2)
+        stripped = name.lstrip()
+        depth = (len(name) - len(stripped) - 1) // 2
+        yield stripped, int(self_us), int(cumulative_us), depth
+
+
+def cmd_profile(args):
+    server, stub_url = start_stub_server()
+    env = child_env(stub_url, args.lazy)
+    out = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import api.index'],
+                         env=env, cwd=ROOT, capture_output=True, text=True)
+    server.shutdown()
+    if out.returncode != 0:
+        sys.exit(out.stderr)
+
+    by_package = defaultdict(int)
+    total = 0
+    for module, self_us, _, _ in parse_importtime(out.stderr):
+        by_package[module.split('.')[0]] += self_us
+        total += self_us
+
+    mode = 'lazy' if args.lazy else 'eager'
+    print(f"import api.index ({mode}): {total / 1000:.1f} ms total\n")
+    print(f"{'package':<32}{'ms':>10}{'share':>8}")
+    for package, us in sorted(by_package.items(), key=lambda kv: -kv[1])[:args.top]:
+        print(f"{package:<32}{us / 1000:>10.1f}{us / total:>8.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    run = sub.add_parser('run', help='Time cold starts, eager vs LAZY_INIT')
+    run.add_argument('--samples', type=int, default=5, help='Fresh interpreters per mode')
+    run.add_argument('--json', metavar='PATH', help='Also write results as JSON (for regression tracking)')
+    run.set_defaults(func=cmd_run)
+
+    profile = sub.add_parser('profile', help='Import-time report grouped by package')
+    profile.add_argument('--top', type=int, default=20)
+    profile.add_argument('--lazy', action='store_true', help='Profile with LAZY_INIT on')
+    profile.set_defaults(func=cmd_profile)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,371 @@
+"""
+Local stand-in for the Google REST APIs this service calls.
+
+Implements just enough of Firestore (documents get/list/create/patch/delete,
+:commit, :batchWrite, :batchGet, :runQuery) and Identity Toolkit
+(accounts:lookup) for benchmarks and tests, with optional injected latency
+and per-request fault injection (FirestoreState.faults).
+
+ID tokens are not verified: any JWT-shaped token from make_stub_token() is
+accepted as the user in its 'sub' claim.
+
+    python benchmarks/stub_server.py --port 8085 --latency-ms 40
+"""
+import argparse
+import base64
+import json
+import re
+import secrets
+import string
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+DOC_ROOT_RE = re.compile(r'^/v1/(projects/[^/]+/databases/\(default\)/documents)(.*)$')
+_ID_ALPHABET = string.ascii_letters + string.digits
+
+
+def make_stub_token(uid, lifetime=3600):
+    """Unsigned JWT-shaped token; its exp lets the app's token cache work as in production."""
+    def b64(obj):
+        return base64.urlsafe_b64encode(json.dumps(obj).encode('utf-8')).rstrip(b'=').decode('ascii')
+    now = int(time.time())
+    return f"{b64({'alg': 'none'})}.{b64({'sub': uid, 'iat': now, 'exp': now + lifetime})}.stub"
+
+
+def _stub_token_uid(token):
+    try:
+        payload = token.split('.')[1]
+        return json.loads(base64.urlsafe_b64decode(payload + '=' * (-len(payload) % 4)))['sub']
+    except (IndexError, KeyError, ValueError):
+        return None
+
+
+def _now():
+    return datetime.utcnow().isoformat() + "Z"
+
+
+def _parse_ts(value):
+    return datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+
+class FirestoreState:
+    """In-memory document tree keyed by full resource name."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.docs = {}  # name -> {'name', 'fields', 'createTime', 'updateTime'}
+        # Fault injection for tests: each request pops one (status, headers) and
+        # answers with it instead of being routed; every request is logged
+        self.faults = []
+        self.requests = deque(maxlen=1000)  # (method, path), most recent last
+
+    def reset(self):
+        with self.lock:
+            self.docs.clear()
+            self.faults.clear()
+            self.requests.clear()
+
+    def put(self, name, fields, merge_paths=None, now=None):
+        now = now or _now()
+        existing = self.docs.get(name)
+        if existing and merge_paths is not None:
+            merged = dict(existing['fields'])
+            for path in merge_paths:
+                if path in fields:
+                    merged[path] = fields[path]
+                else:
+                    merged.pop(path, None)
+            fields = merged
+        doc = {
+            'name': name,
+            'fields': fields,
+            'createTime': existing['createTime'] if existing else now,
+            'updateTime': now,
+        }
+        self.docs[name] = doc
+        return doc
+
+    def children(self, collection_name):
+        prefix = collection_name + '/'
+        return sorted(
+            (d for n, d in self.docs.items() if n.startswith(prefix) and '/' not in n[len(prefix):]),
+            key=lambda d: d['name'],
+        )
+
+    def check_precondition(self, name, precondition):
+        if not precondition:
+            return True
+        doc = self.docs.get(name)
+        if 'exists' in precondition:
+            want = precondition['exists'] in (True, 'true')
+            return (doc is not None) == want
+        if 'updateTime' in precondition:
+            return doc is not None and doc['updateTime'] == precondition['updateTime']
+        return True
+
+
+def _sort_value(value):
+    """Comparable key for a Firestore typed value (enough for the types the app queries on)."""
+    if value is None:
+        return (0, '')
+    if 'timestampValue' in value:
+        return (1, _parse_ts(value['timestampValue']))
+    if 'referenceValue' in value:
+        return (2, value['referenceValue'])
+    return (3, next(iter(value.values())))
+
+
+def _field_value(doc, path):
+    if path == '__name__':
+        return {'referenceValue': doc['name']}
+    return doc['fields'].get(path)
+
+
+def _mask(doc, paths):
+    if not paths:
+        return doc
+    return {**doc, 'fields': {k: v for k, v in doc['fields'].items() if k in paths}}
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    state = FirestoreState()
+    latency = 0.0
+    protocol_version = 'HTTP/1.1'
+    # Headers and body go out in separate writes; with Nagle on, delayed ACK
+    # holds the body back ~40 ms on every keep-alive request
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body, headers=None):
+        payload = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _error(self, status, code, message):
+        self._send(status, {'error': {'code': status, 'status': code, 'message': message}})
+
+    def _body(self):
+        return json.loads(self._raw_body) if self._raw_body else {}
+
+    def _dispatch(self, method):
+        # Read the whole body before routing: error responses that never look at
+        # it would otherwise leave it in the socket, and the next request on the
+        # keep-alive connection would be parsed from those leftover bytes
+        length = int(self.headers.get('Content-Length') or 0)
+        self._raw_body = self.rfile.read(length) if length else b''
+        with self.state.lock:
+            self.state.requests.append((method, urlparse(self.path).path))
+            fault = self.state.faults.pop(0) if self.state.faults else None
+        if fault:
+            status, headers = fault
+            return self._send(status, {'error': {'code': status, 'status': 'UNAVAILABLE', 'message': 'Injected fault'}}, headers)
+        if self.latency:
+            time.sleep(self.latency)
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        path = url.path
+
+        if path == '/v1/accounts:lookup' and method == 'POST':
+            return self._accounts_lookup()
+
+        match = DOC_ROOT_RE.match(path)
+        if not match:
+            return self._error(404, 'NOT_FOUND', f'No route for {path}')
+        root, rest = match.groups()
+
+        if rest.startswith(':'):
+            return self._root_action(root, rest[1:], method)
+        if ':' in rest:
+            parent, action = rest.rsplit(':', 1)
+            if action == 'runQuery' and method == 'POST':
+                return self._run_query(root + parent)
+            return self._error(404, 'NOT_FOUND', f'Unknown action {action}')
+
+        name = root + rest
+        segments = rest.strip('/').split('/')
+        is_collection = len(segments) % 2 == 1
+
+        with self.state.lock:
+            if is_collection and method == 'GET':
+                return self._list(name, query)
+            if is_collection and method == 'POST':
+                doc_id = ''.join(secrets.choice(_ID_ALPHABET) for _ in range(20))
+                return self._send(200, self.state.put(f'{name}/{doc_id}', self._body().get('fields', {})))
+            if not is_collection and method == 'GET':
+                doc = self.state.docs.get(name)
+                if doc is None:
+                    return self._error(404, 'NOT_FOUND', 'Document not found')
+                return self._send(200, _mask(doc, query.get('mask.fieldPaths')))
+            if not is_collection and method == 'PATCH':
+                precondition = {k.split('.', 1)[1]: v[0] for k, v in query.items() if k.startswith('currentDocument.')}
+                if not self.state.check_precondition(name, precondition):
+                    return self._error(400, 'FAILED_PRECONDITION', 'Precondition failed')
+                return self._send(200, self.state.put(name, self._body().get('fields', {}), query.get('updateMask.fieldPaths')))
+            if not is_collection and method == 'DELETE':
+                self.state.docs.pop(name, None)
+                return self._send(200, {})
+        return self._error(405, 'UNIMPLEMENTED', f'{method} not supported here')
+
+    def _accounts_lookup(self):
+        uid = _stub_token_uid(self._body().get('idToken', ''))
+        if not uid:
+            return self._error(400, 'INVALID_ID_TOKEN', 'INVALID_ID_TOKEN')
+        return self._send(200, {'users': [{'localId': uid, 'email': f'{uid}@bench.local'}]})
+
+    def _list(self, name, query):
+        docs = self.state.children(name)
+        order_by = (query.get('orderBy') or [None])[0]
+        if order_by:
+            field, _, direction = order_by.partition(' ')
+            docs.sort(key=lambda d: json.dumps(d['fields'].get(field)), reverse=direction.lower() == 'desc')
+        page_size = int((query.get('pageSize') or ['300'])[0])
+        offset = int((query.get('pageToken') or ['0'])[0])
+        page = docs[offset:offset + page_size]
+        body = {'documents': [_mask(d, query.get('mask.fieldPaths')) for d in page]}
+        if offset + page_size < len(docs):
+            body['nextPageToken'] = str(offset + page_size)
+        return self._send(200, body)
+
+    def _apply_write(self, write, now):
+        """Returns (code, message, writeResult); code/message in google.rpc.Status style."""
+        name = write.get('delete') or write['update']['name']
+        if not self.state.check_precondition(name, write.get('currentDocument')):
+            return 9, 'FAILED_PRECONDITION', {}
+        if 'delete' in write:
+            self.state.docs.pop(name, None)
+            return 0, '', {'updateTime': now}
+        mask = write.get('updateMask', {}).get('fieldPaths')
+        doc = self.state.put(name, write['update'].get('fields', {}), mask, now)
+        for transform in write.get('updateTransforms', []):
+            # Only REQUEST_TIME is supported; every write in a request shares it
+            if transform.get('setToServerValue') == 'REQUEST_TIME':
+                doc['fields'][transform['fieldPath']] = {'timestampValue': now}
+        return 0, '', {'updateTime': now}
+
+    def _root_action(self, root, action, method):
+        if method != 'POST':
+            return self._error(405, 'UNIMPLEMENTED', 'Use POST')
+        body = self._body()
+        with self.state.lock:
+            now = _now()
+            if action == 'commit':
+                # Atomic: check every precondition before applying anything
+                for write in body.get('writes', []):
+                    name = write.get('delete') or write['update']['name']
+                    if not self.state.check_precondition(name, write.get('currentDocument')):
+                        return self._error(400, 'FAILED_PRECONDITION', 'Precondition failed')
+                results = [self._apply_write(w, now)[2] for w in body.get('writes', [])]
+                return self._send(200, {'writeResults': results, 'commitTime': now})
+            if action == 'batchWrite':
+                statuses = [self._apply_write(w, now) for w in body.get('writes', [])]
+                return self._send(200, {
+                    'writeResults': [r for _, _, r in statuses],
+                    'status': [{'code': c, 'message': m} for c, m, _ in statuses],
+                })
+            if action == 'batchGet':
+                mask = body.get('mask', {}).get('fieldPaths')
+                results = []
+                for name in body.get('documents', []):
+                    doc = self.state.docs.get(name)
+                    results.append({'found': _mask(doc, mask)} if doc else {'missing': name})
+                return self._send(200, results)
+        return self._error(404, 'NOT_FOUND', f'Unknown action {action}')
+
+    def _run_query(self, parent):
+        query = self._body().get('structuredQuery', {})
+        collection = query['from'][0]['collectionId']
+        with self.state.lock:
+            docs = self.state.children(f'{parent}/{collection}')
+
+        field_filter = query.get('where', {}).get('fieldFilter')
+        if field_filter:
+            path = field_filter['field']['fieldPath']
+            op = field_filter['op']
+            value = field_filter['value']
+
+            def keep(doc):
+                current = doc['fields'].get(path)
+                if current is None:
+                    return False
+                if 'timestampValue' in value:
+                    left, right = _parse_ts(current['timestampValue']), _parse_ts(value['timestampValue'])
+                else:
+                    left, right = next(iter(current.values())), next(iter(value.values()))
+                return {
+                    'EQUAL': left == right, 'GREATER_THAN': left > right,
+                    'GREATER_THAN_OR_EQUAL': left >= right, 'LESS_THAN': left < right,
+                }.get(op, False)
+
+            docs = [d for d in docs if keep(d)]
+
+        orders = query.get('orderBy', [])
+        for order in reversed(orders):
+            path = order['field']['fieldPath']
+            docs.sort(key=lambda d: _sort_value(_field_value(d, path)), reverse=order.get('direction') == 'DESCENDING')
+
+        start_at = query.get('startAt')
+        if start_at:
+            # Cursor values are a prefix of orderBy; before=false means startAfter
+            # (ascending order only, which is all the app uses with cursors)
+            values = [_sort_value(v) for v in start_at['values']]
+            paths = [o['field']['fieldPath'] for o in orders[:len(values)]]
+
+            def after_cursor(doc):
+                key = [_sort_value(_field_value(doc, p)) for p in paths]
+                return key >= values if start_at.get('before') else key > values
+
+            docs = [d for d in docs if after_cursor(d)]
+        if 'limit' in query:
+            docs = docs[:query['limit']]
+
+        read_time = _now()
+        if not docs:
+            return self._send(200, [{'readTime': read_time}])
+        return self._send(200, [{'document': d, 'readTime': read_time} for d in docs])
+
+    def do_GET(self):
+        self._dispatch('GET')
+
+    def do_POST(self):
+        self._dispatch('POST')
+
+    def do_PATCH(self):
+        self._dispatch('PATCH')
+
+    def do_DELETE(self):
+        self._dispatch('DELETE')
+
+
+def start_stub_server(host='127.0.0.1', port=0, latency_ms=0):
+    """Start the stub in a background thread. Returns (server, base_url)."""
+    handler = type('Handler', (StubHandler,), {'state': FirestoreState(), 'latency': latency_ms / 1000.0})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://{host}:{server.server_address[1]}'
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8085)
+    parser.add_argument('--latency-ms', type=float, default=0, help='Delay added to every response')
+    args = parser.parse_args()
+
+    server, url = start_stub_server(args.host, args.port, args.latency_ms)
+    print(f'Stub Firestore/Identity Toolkit listening on {url}')
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,30 @@
+import os
+
+# Gunicorn settings for Render (and any other long-running host).
+#
+# The app spends most of each request waiting on Firestore and Google Identity
+# Toolkit. With the default sync worker that wait blocks the whole process, so
+# throughput is capped at workers x upstream latency. The gevent worker
+# monkey-patches sockets, so every outbound `requests`/`http_client` call yields
+# and one worker can keep hundreds of requests in flight.
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '10000')}"
+workers = int(os.environ.get('WEB_CONCURRENCY', 1))
+# Set GUNICORN_WORKER_CLASS=sync to go back to the blocking worker
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gevent')
+# Max concurrent requests per gevent worker
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 500))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+keepalive = 5
+
+
+def post_worker_init(worker):
+    # firebase_admin's Firestore client talks gRPC, which has its own event loop.
+    # Point it at gevent so Admin SDK calls (WebAuthn, challenges) don't block the hub.
+    if worker_class != 'gevent':
+        return
+    try:
+        from grpc.experimental import gevent as grpc_gevent
+        grpc_gevent.init_gevent()
+    except ImportError:
+        pass
@@ -0,0 +1,63 @@
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+# Keep the module-level app in app.app from initialising the Admin SDK
+os.environ.setdefault('LAZY_INIT', 'true')
+
+import pytest
+from stub_server import start_stub_server, make_stub_token
+from app.app import create_app
+from app.config import Config
+
+PROJECT_ID = 'test-project'
+DOC_ROOT = f'projects/{PROJECT_ID}/databases/(default)/documents'
+
+# A valid vault entry body for POST/PUT /api/vault
+ENTRY = {'site': 'example.com', 'username': 'alice', 'encryptedPassword': 'x', 'iv': 'y'}
+
+
+@pytest.fixture(scope='session')
+def stub():
+    server, url = start_stub_server()
+    yield server, url
+    server.shutdown()
+
+
+@pytest.fixture
+def stub_state(stub):
+    state = stub[0].RequestHandlerClass.state
+    state.reset()
+    return state
+
+
+@pytest.fixture
+def app(stub, stub_state):
+    class TestConfig(Config):
+        TESTING = True
+        LAZY_INIT = True
+        FIREBASE_PROJECT_ID = PROJECT_ID
+        FIREBASE_API_KEY = 'test'
+        FIRESTORE_BASE_URL = stub[1]
+        IDENTITY_TOOLKIT_BASE_URL = stub[1]
+        FIREBASE_TOKEN_VERIFICATION = 'rest'
+        TOKEN_CACHE_ENABLED = False
+        CHALLENGE_STORE = 'memory'
+        RATELIMIT_ENABLED = False
+        HTTP_CLIENT_MAX_RETRIES = 0
+    return create_app(TestConfig)
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def auth_headers():
+    def make(uid='test-user'):
+        return {'Authorization': f'Bearer {make_stub_token(uid)}'}
+    return make
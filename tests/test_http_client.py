@@ -0,0 +1,47 @@
+import pytest
+from app.extensions import http_client
+
+
+@pytest.fixture
+def upstream(app, stub, monkeypatch):
+    app.config.update(HTTP_CLIENT_MAX_RETRIES=2, HTTP_CLIENT_BACKOFF_FACTOR=0.2, HTTP_CLIENT_MAX_RETRY_SLEEP=2.0)
+    sleeps = []
+    monkeypatch.setattr(http_client.time, 'sleep', sleeps.append)
+    with app.app_context():
+        yield stub[1] + '/v1/accounts:lookup', sleeps
+
+
+def test_post_is_not_retried(upstream, stub_state):
+    url, sleeps = upstream
+    stub_state.faults.append((503, {}))
+    response = http_client.post(url, json={'idToken': 'x'})
+    assert response.status_code == 503
+    assert len(stub_state.requests) == 1
+    assert sleeps == []
+
+
+def test_read_only_post_is_retried_when_marked(upstream, stub_state):
+    url, sleeps = upstream
+    stub_state.faults.append((503, {}))
+    response = http_client.post(url, json={'idToken': 'x'}, retry=True)
+    assert response.status_code == 400  # the stub's answer for a bad token, i.e. it got through
+    assert len(stub_state.requests) == 2
+    assert sleeps == [0.2]
+
+
+def test_get_is_retried_with_backoff(upstream, stub_state):
+    url, sleeps = upstream
+    stub_state.faults += [(503, {}), (429, {})]
+    response = http_client.get(url.replace('/v1/accounts:lookup', '/v1/nowhere'))
+    assert response.status_code == 404
+    assert len(stub_state.requests) == 3
+    assert sleeps == [0.2, 0.4]
+
+
+def test_retry_after_beyond_sleep_budget_returns_immediately(upstream, stub_state):
+    url, sleeps = upstream
+    stub_state.faults.append((503, {'Retry-After': '5'}))
+    response = http_client.get(url)
+    assert response.status_code == 503
+    assert len(stub_state.requests) == 1
+    assert sleeps == []
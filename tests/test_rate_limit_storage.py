@@ -0,0 +1,91 @@
+import subprocess
+import sys
+import threading
+import pytest
+from limits import parse
+from limits.storage import storage_from_string
+from limits.strategies import FixedWindowRateLimiter
+from app.extensions.limiter import SQLiteStorage
+from conftest import ROOT
+
+
+@pytest.fixture
+def storage(tmp_path):
+    return SQLiteStorage(f'sqlite://{tmp_path}/ratelimit.db')
+
+
+def test_sqlite_scheme_is_registered(tmp_path):
+    assert isinstance(storage_from_string(f'sqlite://{tmp_path}/ratelimit.db'), SQLiteStorage)
+
+
+def test_incr_counts_within_a_window(storage):
+    assert storage.incr('k', 60) == 1
+    assert storage.incr('k', 60, amount=2) == 3
+    assert storage.get('k') == 3
+    assert storage.get('other') == 0
+
+
+def test_expired_window_starts_over(storage, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr('app.extensions.limiter.time.time', lambda: now[0])
+    storage.incr('k', 10)
+    storage.incr('k', 10)
+    assert storage.get_expiry('k') == 1010.0
+
+    now[0] = 1011.0
+    assert storage.get('k') == 0
+    assert storage.incr('k', 10) == 1
+    assert storage.get_expiry('k') == 1021.0
+
+
+def test_clear_and_reset(storage):
+    storage.incr('a', 60)
+    storage.incr('b', 60)
+    storage.clear('a')
+    assert storage.get('a') == 0
+    assert storage.reset() == 1
+    assert storage.get('b') == 0
+    assert storage.check()
+
+
+def test_counters_are_shared_between_instances(tmp_path):
+    # Two workers on one host open the same file
+    uri = f'sqlite://{tmp_path}/ratelimit.db'
+    SQLiteStorage(uri).incr('k', 60)
+    assert SQLiteStorage(uri).incr('k', 60) == 2
+
+
+def test_limiter_enforces_limit(storage):
+    limiter = FixedWindowRateLimiter(storage)
+    limit = parse('3/minute')
+    assert [limiter.hit(limit, '1.2.3.4') for _ in range(4)] == [True, True, True, False]
+    assert limiter.hit(limit, '5.6.7.8')
+
+
+def test_concurrent_incr_loses_no_updates(storage):
+    threads = [threading.Thread(target=lambda: [storage.incr('k', 60) for _ in range(25)]) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert storage.get('k') == 200
+
+
+GEVENT_CHILD = r"""
+from gevent import monkey; monkey.patch_all()
+import sqlite3, sys, tempfile, gevent
+connects = []
+original = sqlite3.connect
+sqlite3.connect = lambda *a, **kw: connects.append(1) or original(*a, **kw)
+from app.extensions.limiter import SQLiteStorage
+storage = SQLiteStorage('sqlite://' + tempfile.mkdtemp() + '/ratelimit.db')
+gevent.joinall([gevent.spawn(storage.incr, 'k', 60) for _ in range(50)])
+print(len(connects), storage.get('k'))
+"""
+
+
+def test_one_connection_per_process_under_gevent():
+    pytest.importorskip('gevent')
+    out = subprocess.run([sys.executable, '-c', GEVENT_CHILD], cwd=ROOT,
+                         capture_output=True, text=True, check=True)
+    assert out.stdout.split() == ['1', '50']
@@ -0,0 +1,78 @@
+from datetime import datetime, timedelta, timezone
+import pytest
+from app.services.sign_count_writer import SignCountWriter, _apply_sign_counts
+
+T0 = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+class FakeSnapshot:
+    def __init__(self, ref, data):
+        self.reference = ref
+        self.exists = data is not None
+        self._data = data
+
+    def to_dict(self):
+        return self._data
+
+
+class FakeRef:
+    def __init__(self, path):
+        self.path = path
+
+
+class FakeTransaction:
+    def __init__(self, stored):
+        self.stored = stored  # path -> dict, or None for a missing document
+        self.sets = {}
+
+    def get_all(self, refs):
+        return [FakeSnapshot(ref, self.stored.get(ref.path)) for ref in refs]
+
+    def set(self, ref, data, merge=False):
+        assert merge
+        self.sets[ref.path] = data
+
+
+@pytest.fixture
+def writer():
+    # No background thread: tests drive _merge / _take_batch directly
+    writer = SignCountWriter(batch_size=10)
+    yield writer
+    # Nothing left for the atexit flush to try to write
+    writer._pending.clear()
+
+
+def test_merge_keeps_highest_sign_count_and_latest_use(writer):
+    key = ('u', 'c')
+    writer._merge(key, 7, T0)
+    writer._merge(key, 5, T0 + timedelta(seconds=2))
+    writer._merge(key, 6, T0 + timedelta(seconds=1))
+    assert writer._pending[key] == (7, T0 + timedelta(seconds=2))
+
+
+def test_failed_batch_is_merged_back_without_lowering(writer):
+    key = ('u', 'c')
+    writer._merge(key, 3, T0)
+    batch = writer._take_batch()
+    # A newer login arrives while the failed batch is in flight
+    writer._merge(key, 9, T0 + timedelta(seconds=1))
+    for k, (count, used) in batch.items():
+        writer._merge(k, count, used)
+    assert writer._pending[key] == (9, T0 + timedelta(seconds=1))
+
+
+def test_apply_never_lowers_stored_count():
+    refs = {('u', 'a'): FakeRef('a'), ('u', 'b'): FakeRef('b')}
+    transaction = FakeTransaction({'a': {'sign_count': 10}, 'b': {'sign_count': 2}})
+    _apply_sign_counts.to_wrap(transaction, refs, {('u', 'a'): (4, T0), ('u', 'b'): (5, T0)})
+    assert transaction.sets == {
+        'a': {'sign_count': 10, 'last_used_at': T0},
+        'b': {'sign_count': 5, 'last_used_at': T0},
+    }
+
+
+def test_apply_skips_deleted_credentials():
+    refs = {('u', 'gone'): FakeRef('gone')}
+    transaction = FakeTransaction({'gone': None})
+    _apply_sign_counts.to_wrap(transaction, refs, {('u', 'gone'): (4, T0)})
+    assert transaction.sets == {}
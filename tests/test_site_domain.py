@@ -0,0 +1,31 @@
+import pytest
+from app.services.site_domain import registrable_domain
+
+# These values are stored in Firestore and matched by equality on lookup:
+# changing any of them orphans existing entries until they are backfilled.
+
+
+@pytest.mark.parametrize('site, expected', [
+    ('https://Login.Example.co.uk:8443/path?q=1', 'example.co.uk'),
+    ('example.com:8080', 'example.com'),
+    ('www.example.com', 'example.com'),
+    ('https://a.b.example.com/', 'example.com'),
+    ('example.com.', 'example.com'),
+    ('accounts.example.co.uk', 'example.co.uk'),
+    ('example.co.uk', 'example.co.uk'),
+    ('https://user.github.io/repo', 'user.github.io'),
+    ('http://192.168.0.1:8080/admin', '192.168.0.1'),
+    ('http://[2001:db8::1]/', '2001:db8::1'),
+    ('localhost', 'localhost'),
+    ('http://localhost:3000', 'localhost'),
+    ('bücher.de', 'xn--bcher-kva.de'),
+    ('https://shop.bücher.de', 'xn--bcher-kva.de'),
+    ('xn--bcher-kva.de', 'xn--bcher-kva.de'),
+])
+def test_registrable_domain(site, expected):
+    assert registrable_domain(site) == expected
+
+
+@pytest.mark.parametrize('site', ['', '   ', None, 'https://', 'http://[not-an-ip/'])
+def test_registrable_domain_without_host(site):
+    assert registrable_domain(site) == ''
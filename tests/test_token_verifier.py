@@ -0,0 +1,80 @@
+import base64
+import json
+import time
+
+import pytest
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric import padding, rsa
+
+from app.extensions import token_verifier
+from app.extensions.token_verifier import TokenVerificationError, verify_id_token_locally
+
+PROJECT_ID = 'test-project'
+PRIVATE_KEY = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+
+
+def _b64(data):
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode('ascii')
+
+
+def make_token(kid='key-1', **overrides):
+    now = int(time.time())
+    claims = {
+        'aud': PROJECT_ID,
+        'iss': f'https://securetoken.google.com/{PROJECT_ID}',
+        'sub': 'user-1',
+        'iat': now - 10,
+        'exp': now + 3600,
+        **overrides,
+    }
+    header = _b64(json.dumps({'alg': 'RS256', 'kid': kid}).encode())
+    payload = _b64(json.dumps(claims).encode())
+    signature = PRIVATE_KEY.sign(f'{header}.{payload}'.encode(), padding.PKCS1v15(), hashes.SHA256())
+    return f'{header}.{payload}.{_b64(signature)}'
+
+
+@pytest.fixture
+def fetches(monkeypatch):
+    calls = []
+
+    def fake_fetch():
+        calls.append(time.time())
+        return {'key-1': PRIVATE_KEY.public_key()}, time.time() + 3600
+
+    cache = token_verifier._CertificateCache()
+    monkeypatch.setattr(cache, '_fetch', fake_fetch)
+    monkeypatch.setattr(token_verifier, '_cert_cache', cache)
+    return calls
+
+
+def test_valid_token(fetches):
+    claims = verify_id_token_locally(make_token(), PROJECT_ID)
+    assert claims['sub'] == 'user-1'
+
+
+def test_expired_token_gets_no_grace_period(fetches):
+    with pytest.raises(TokenVerificationError, match='expired'):
+        verify_id_token_locally(make_token(exp=int(time.time()) - 5), PROJECT_ID)
+
+
+@pytest.mark.parametrize('claims', [{'aud': 'other'}, {'iss': 'https://evil'}, {'sub': ''}, {'iat': int(time.time()) + 3600}])
+def test_bad_claims(fetches, claims):
+    with pytest.raises(TokenVerificationError):
+        verify_id_token_locally(make_token(**claims), PROJECT_ID)
+
+
+def test_bad_signature(fetches):
+    header, _, signature = make_token().split('.')
+    forged_payload = make_token(sub='someone-else').split('.')[1]
+    with pytest.raises(TokenVerificationError, match='signature'):
+        verify_id_token_locally(f'{header}.{forged_payload}.{signature}', PROJECT_ID)
+
+
+def test_unknown_kids_do_not_refetch_every_request(fetches):
+    verify_id_token_locally(make_token(), PROJECT_ID)
+    assert len(fetches) == 1
+    for i in range(20):
+        with pytest.raises(TokenVerificationError, match='unknown key'):
+            verify_id_token_locally(make_token(kid=f'forged-{i}'), PROJECT_ID)
+    # The forced refresh was throttled: still only the initial fetch
+    assert len(fetches) == 1
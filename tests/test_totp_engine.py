@@ -0,0 +1,39 @@
+import pyotp
+import pytest
+
+from app.services.totp_engine import TOTPEngine
+
+SECRET = pyotp.random_base32()
+NOW = 1_700_000_000
+
+
+def code_at(offset_steps=0):
+    return pyotp.TOTP(SECRET).at(NOW + offset_steps * 30)
+
+
+def test_accepts_codes_inside_the_window():
+    engine = TOTPEngine()
+    assert engine.verify('u1', SECRET, code_at(-1), now=NOW)
+    assert engine.verify('u2', SECRET, code_at(0), now=NOW)
+    assert engine.verify('u3', SECRET, code_at(1), now=NOW)
+    assert not engine.verify('u4', SECRET, code_at(3), now=NOW)
+
+
+def test_code_cannot_be_replayed():
+    engine = TOTPEngine()
+    assert engine.verify('u1', SECRET, code_at(0), now=NOW)
+    assert not engine.verify('u1', SECRET, code_at(0), now=NOW)
+    # An older code from the window is spent too
+    assert not engine.verify('u1', SECRET, code_at(-1), now=NOW)
+    # Other users are unaffected
+    assert engine.verify('u2', SECRET, code_at(0), now=NOW)
+
+
+@pytest.mark.parametrize('code', ['１２３４５６', 'abcdef', '12 34', '', '١٢٣٤٥٦'])
+def test_malformed_codes_are_rejected_without_error(code):
+    assert not TOTPEngine().verify('u1', SECRET, code, now=NOW)
+
+
+def test_enable_rejects_non_ascii_code_with_400(client, auth_headers):
+    response = client.post('/api/auth/2fa/enable', json={'secret': SECRET, 'code': '１２３４５６'}, headers=auth_headers())
+    assert response.status_code == 400
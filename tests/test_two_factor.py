@@ -0,0 +1,57 @@
+import pyotp
+from conftest import DOC_ROOT
+from app.services.two_factor_cache import TwoFactorCache
+
+
+def _store_2fa(stub_state, uid, enabled, secret):
+    with stub_state.lock:
+        stub_state.put(f'{DOC_ROOT}/users/{uid}', {
+            'twoFactorEnabled': {'booleanValue': enabled},
+            'twoFactorSecret': {'stringValue': secret},
+        })
+
+
+def test_cache_does_not_serve_disabled_without_shared_store():
+    cache = TwoFactorCache(ttl=60)
+    cache.set('u1', {'enabled': False, 'secret': None})
+    cache.set('u2', {'enabled': True, 'secret': 'S'})
+    assert cache.get('u1') is None
+    assert cache.get('u2') == {'enabled': True, 'secret': 'S'}
+
+
+def test_login_gate_sees_2fa_enabled_by_another_worker(client, auth_headers, stub_state):
+    uid = 'gate-user'
+    headers = auth_headers(uid)
+    assert client.get('/api/auth/2fa/status', headers=headers).get_json() == {'enabled': False}
+
+    # Another process enables 2FA; this process is never told
+    _store_2fa(stub_state, uid, True, pyotp.random_base32())
+
+    response = client.post('/api/auth/2fa/verify', json={'code': '000000'}, headers=headers)
+    assert response.status_code == 401
+
+
+def test_login_gate_accepts_code_for_secret_changed_elsewhere(client, auth_headers, stub_state):
+    uid = 'rotated-user'
+    headers = auth_headers(uid)
+    _store_2fa(stub_state, uid, True, pyotp.random_base32())
+    assert client.get('/api/auth/2fa/status', headers=headers).get_json() == {'enabled': True}
+
+    new_secret = pyotp.random_base32()
+    _store_2fa(stub_state, uid, True, new_secret)
+
+    response = client.post('/api/auth/2fa/verify', json={'code': pyotp.TOTP(new_secret).now()}, headers=headers)
+    assert response.status_code == 200
+    assert response.get_json() == {'message': 'verified'}
+
+
+def test_enable_then_verify(client, auth_headers):
+    headers = auth_headers('enable-user')
+    secret = pyotp.random_base32()
+    code = pyotp.TOTP(secret).now()
+    response = client.post('/api/auth/2fa/enable', json={'secret': secret, 'code': code}, headers=headers)
+    assert response.status_code == 200
+    assert client.get('/api/auth/2fa/status', headers=headers).get_json() == {'enabled': True}
+    # The enable code was spent; replaying it at login is rejected
+    response = client.post('/api/auth/2fa/verify', json={'code': code}, headers=headers)
+    assert response.status_code == 401
@@ -0,0 +1,92 @@
+from conftest import ENTRY
+
+
+def _batch(client, headers, operations):
+    response = client.post('/api/vault/batch', json={'operations': operations}, headers=headers)
+    assert response.status_code == 200
+    return response.get_json()['results']
+
+
+def test_batch_create_update_delete(client, auth_headers):
+    headers = auth_headers()
+    created = _batch(client, headers, [{'op': 'create', 'data': ENTRY}, {'op': 'create', 'data': ENTRY}])
+    assert [r['status'] for r in created] == ['ok', 'ok']
+    first, second = created[0]['id'], created[1]['id']
+
+    results = _batch(client, headers, [
+        {'op': 'update', 'id': first, 'data': {**ENTRY, 'username': 'bob'}},
+        {'op': 'delete', 'id': second},
+    ])
+    assert [r['status'] for r in results] == ['ok', 'ok']
+
+    assert client.get(f'/api/vault/{first}', headers=headers).get_json()['username'] == 'bob'
+    assert client.get(f'/api/vault/{second}', headers=headers).status_code == 404
+
+
+def test_batch_update_of_missing_entry_fails_alone(client, auth_headers):
+    headers = auth_headers()
+    results = _batch(client, headers, [
+        {'op': 'update', 'id': 'doesNotExist', 'data': ENTRY},
+        {'op': 'create', 'data': ENTRY},
+    ])
+    assert results[0]['status'] == 'error'
+    assert results[1]['status'] == 'ok'
+
+
+def test_batch_rejects_malformed_operations(client, auth_headers, stub_state):
+    headers = auth_headers()
+    results = _batch(client, headers, [
+        {'op': 'create', 'data': 'siteusernameencryptedPasswordiv'},
+        {'op': 'update', 'id': 'abc', 'data': ['site']},
+        {'op': 'delete', 'id': 'a/b/c'},
+        {'op': 'delete', 'id': 42},
+        {'op': 'create', 'data': {'site': 'x'}},
+        'not an object',
+        {'op': 'upsert'},
+    ])
+    assert all(r['status'] == 'error' for r in results)
+    # Nothing was written, in particular no nested documents
+    assert not stub_state.docs
+
+
+def test_batch_keeps_delete_and_tombstone_in_one_request(client, auth_headers, monkeypatch):
+    from app.controllers import vault_controller
+    headers = auth_headers()
+    ids = [r['id'] for r in _batch(client, headers, [{'op': 'create', 'data': ENTRY}] * 2)]
+
+    sent = []
+    original_post = vault_controller.http_client.post
+
+    def post(url, json=None, **kwargs):
+        if url.endswith(':batchWrite'):
+            sent.append([next(iter(w)) for w in json['writes']])
+        return original_post(url, json=json, **kwargs)
+
+    monkeypatch.setattr(vault_controller, 'BATCH_WRITE_CHUNK_SIZE', 3)
+    monkeypatch.setattr(vault_controller.http_client, 'post', post)
+    results = _batch(client, headers, [
+        {'op': 'create', 'data': ENTRY},
+        {'op': 'create', 'data': ENTRY},
+        {'op': 'delete', 'id': ids[0]},
+        {'op': 'delete', 'id': ids[1]},
+    ])
+    assert [r['status'] for r in results] == ['ok'] * 4
+    # Filling chunks to 3 writes would split the first delete from its tombstone
+    assert sent == [['update', 'update'], ['delete', 'update'], ['delete', 'update']]
+
+
+def test_batch_delete_fails_when_its_tombstone_does(client, auth_headers, monkeypatch):
+    from app.controllers import vault_controller
+    headers = auth_headers()
+    entry_id = _batch(client, headers, [{'op': 'create', 'data': ENTRY}])[0]['id']
+
+    original = vault_controller._tombstone_write
+
+    def failing_tombstone(uid, entry_id):
+        # The stub rejects this precondition, as the rules would reject the write
+        return {**original(uid, entry_id), 'currentDocument': {'exists': True}}
+
+    monkeypatch.setattr(vault_controller, '_tombstone_write', failing_tombstone)
+    result = _batch(client, headers, [{'op': 'delete', 'id': entry_id}])[0]
+    assert result['status'] == 'error'
+    assert 'not recorded for sync' in result['error']
@@ -0,0 +1,63 @@
+from conftest import DOC_ROOT, ENTRY
+
+
+def _sync(client, headers, params):
+    seen_updated, seen_deleted = [], []
+    while True:
+        response = client.get('/api/vault/changes', query_string=params, headers=headers)
+        assert response.status_code == 200
+        body = response.get_json()
+        seen_updated += [item['id'] for item in body['updated']]
+        seen_deleted += body['deleted']
+        params = {'cursor': body['cursor']}
+        if not body['hasMore']:
+            return seen_updated, seen_deleted, body['cursor']
+
+
+def test_changes_pages_through_entries_sharing_a_timestamp(client, auth_headers):
+    headers = auth_headers()
+    operations = [{'op': 'create', 'data': ENTRY} for _ in range(1500)]
+    response = client.post('/api/vault/batch', json={'operations': operations}, headers=headers)
+    created = [r['id'] for r in response.get_json()['results']]
+    assert len(created) == 1500
+
+    updated, deleted, _ = _sync(client, headers, {'since': '2000-01-01T00:00:00Z'})
+
+    assert sorted(updated) == sorted(created)
+    assert len(updated) == len(set(updated))
+    assert deleted == []
+
+
+def test_changes_cursor_resumes_after_new_writes(client, auth_headers):
+    headers = auth_headers()
+    first = client.post('/api/vault', json=ENTRY, headers=headers).get_json()['id']
+    updated, _, cursor = _sync(client, headers, {'since': '2000-01-01T00:00:00Z'})
+    assert updated == [first]
+
+    second = client.post('/api/vault', json=ENTRY, headers=headers).get_json()['id']
+    client.delete(f'/api/vault/{first}', headers=headers)
+
+    updated, deleted, _ = _sync(client, headers, {'cursor': cursor})
+    assert updated == [second]
+    assert deleted == [first]
+
+
+def test_changes_rejects_bad_cursor(client, auth_headers):
+    response = client.get('/api/vault/changes', query_string={'cursor': 'not-a-cursor'}, headers=auth_headers())
+    assert response.status_code == 400
+
+
+def test_sync_timestamps_are_set_by_firestore(client, auth_headers, stub_state):
+    headers = auth_headers()
+    entry_id = client.post('/api/vault', json=ENTRY, headers=headers).get_json()['id']
+    name = f'{DOC_ROOT}/users/test-user/vault/{entry_id}'
+    created_at = stub_state.docs[name]['fields']['createdAt']
+
+    client.put(f'/api/vault/{entry_id}', json={**ENTRY, 'username': 'bob'}, headers=headers)
+    doc = stub_state.docs[name]
+    assert doc['fields']['updatedAt'] == {'timestampValue': doc['updateTime']}
+    assert doc['fields']['createdAt'] == created_at
+
+    client.delete(f'/api/vault/{entry_id}', headers=headers)
+    tombstone = stub_state.docs[f'{DOC_ROOT}/users/test-user/vault_tombstones/{entry_id}']
+    assert tombstone['fields']['deletedAt'] == {'timestampValue': tombstone['updateTime']}
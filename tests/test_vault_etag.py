@@ -0,0 +1,61 @@
+from conftest import ENTRY
+
+
+def _create(client, headers):
+    response = client.post('/api/vault', json=ENTRY, headers=headers)
+    assert response.status_code == 201
+    return response.get_json()['id'], response.headers['ETag']
+
+
+def test_get_entry_honours_if_none_match(client, auth_headers):
+    headers = auth_headers()
+    entry_id, created_etag = _create(client, headers)
+
+    first = client.get(f'/api/vault/{entry_id}', headers=headers)
+    assert first.status_code == 200
+    assert first.headers['ETag'] == created_etag
+
+    cached = client.get(f'/api/vault/{entry_id}', headers={**headers, 'If-None-Match': created_etag})
+    assert cached.status_code == 304
+    assert not cached.data
+
+
+def test_list_etag_changes_after_a_write(client, auth_headers):
+    headers = auth_headers()
+    entry_id, _ = _create(client, headers)
+    etag = client.get('/api/vault', headers=headers).headers['ETag']
+
+    assert client.get('/api/vault', headers={**headers, 'If-None-Match': etag}).status_code == 304
+
+    client.put(f'/api/vault/{entry_id}', json={**ENTRY, 'username': 'bob'}, headers=headers)
+    changed = client.get('/api/vault', headers={**headers, 'If-None-Match': etag})
+    assert changed.status_code == 200
+    assert changed.headers['ETag'] != etag
+
+
+def test_update_with_if_match(client, auth_headers):
+    headers = auth_headers()
+    entry_id, etag = _create(client, headers)
+
+    updated = client.put(f'/api/vault/{entry_id}', json={**ENTRY, 'username': 'bob'},
+                         headers={**headers, 'If-Match': etag})
+    assert updated.status_code == 200
+    assert updated.headers['ETag'] != etag
+
+    # The original ETag is now stale: the second writer must not overwrite bob
+    stale = client.put(f'/api/vault/{entry_id}', json={**ENTRY, 'username': 'carol'},
+                       headers={**headers, 'If-Match': etag})
+    assert stale.status_code == 412
+    assert client.get(f'/api/vault/{entry_id}', headers=headers).get_json()['username'] == 'bob'
+
+    fresh = client.put(f'/api/vault/{entry_id}', json={**ENTRY, 'username': 'carol'},
+                       headers={**headers, 'If-Match': updated.headers['ETag']})
+    assert fresh.status_code == 200
+
+
+def test_if_match_with_several_etags_is_rejected(client, auth_headers):
+    headers = auth_headers()
+    entry_id, etag = _create(client, headers)
+    response = client.put(f'/api/vault/{entry_id}', json=ENTRY,
+                          headers={**headers, 'If-Match': f'{etag}, "other"'})
+    assert response.status_code == 400
@@ -0,0 +1,38 @@
+from conftest import ENTRY
+
+
+def _create(client, headers, site, username='alice'):
+    response = client.post('/api/vault', json={**ENTRY, 'site': site, 'username': username}, headers=headers)
+    assert response.status_code == 201
+    return response.get_json()['id']
+
+
+def test_lookup_matches_registrable_domain_newest_first(client, auth_headers):
+    headers = auth_headers()
+    older = _create(client, headers, 'https://accounts.example.co.uk/login')
+    newer = _create(client, headers, 'example.co.uk', username='bob')
+    _create(client, headers, 'example.com')
+    _create(client, auth_headers('someone-else'), 'example.co.uk')
+
+    response = client.get('/api/vault/lookup', query_string={'domain': 'https://www.Example.co.uk:443/'}, headers=headers)
+    assert response.status_code == 200
+    assert [item['id'] for item in response.get_json()] == [newer, older]
+
+    # Updating an entry moves it to the front
+    client.put(f'/api/vault/{older}', json={**ENTRY, 'site': 'example.co.uk'}, headers=headers)
+    response = client.get('/api/vault/lookup', query_string={'domain': 'example.co.uk'}, headers=headers)
+    assert [item['id'] for item in response.get_json()] == [older, newer]
+
+
+def test_lookup_applies_field_mask(client, auth_headers):
+    headers = auth_headers()
+    entry_id = _create(client, headers, 'example.org')
+    response = client.get('/api/vault/lookup', query_string={'domain': 'example.org', 'fields': 'site,username'},
+                          headers=headers)
+    assert response.get_json() == [{'id': entry_id, 'site': 'example.org', 'username': 'alice'}]
+
+
+def test_lookup_requires_a_domain(client, auth_headers):
+    for params in ({}, {'domain': ''}, {'domain': 'https://'}):
+        response = client.get('/api/vault/lookup', query_string=params, headers=auth_headers())
+        assert response.status_code == 400
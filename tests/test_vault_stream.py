@@ -0,0 +1,47 @@
+import json
+
+import pytest
+
+from app.controllers import vault_controller
+from conftest import DOC_ROOT
+
+
+@pytest.fixture
+def two_pages(stub_state, monkeypatch):
+    uid = 'stream-user'
+    with stub_state.lock:
+        for i in range(3):
+            stub_state.put(f'{DOC_ROOT}/users/{uid}/vault/e{i}', {'site': {'stringValue': f's{i}'}})
+    monkeypatch.setattr(vault_controller, 'MAX_PAGE_SIZE', 2)
+    return uid
+
+
+def test_stream_reads_every_page(client, auth_headers, two_pages):
+    response = client.get('/api/vault', query_string={'stream': 'json'}, headers=auth_headers(two_pages))
+    assert [item['id'] for item in json.loads(response.data)] == ['e0', 'e1', 'e2']
+
+
+@pytest.fixture
+def failing_second_page(monkeypatch):
+    real = vault_controller._list_vault_page
+
+    def list_page(uid, token, page_size, page_token=None, *args):
+        response = real(uid, token, page_size, page_token, *args)
+        if page_token:
+            response.status_code = 503
+        return response
+
+    monkeypatch.setattr(vault_controller, '_list_vault_page', list_page)
+
+
+def test_ndjson_stream_ends_with_error_record(client, auth_headers, two_pages, failing_second_page):
+    response = client.get('/api/vault', query_string={'stream': 'ndjson'}, headers=auth_headers(two_pages))
+    lines = [json.loads(line) for line in response.data.decode().splitlines()]
+    assert [line.get('id') for line in lines[:2]] == ['e0', 'e1']
+    assert lines[-1]['truncated'] is True
+
+
+def test_json_stream_is_left_unterminated(client, auth_headers, two_pages, failing_second_page):
+    response = client.get('/api/vault', query_string={'stream': 'json'}, headers=auth_headers(two_pages))
+    with pytest.raises(json.JSONDecodeError):
+        json.loads(response.data)
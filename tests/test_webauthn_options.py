@@ -0,0 +1,39 @@
+import pytest
+from app.extensions.firestore import FirestoreClient
+from app.services.webauthn_service import credential_cache
+
+CRED_ID = 'AQIDBAUGBwg'
+
+
+@pytest.fixture
+def passkeys(monkeypatch):
+    # The Admin SDK isn't available against the stub; serve the credential index directly
+    loaded = []
+
+    def list_docs(collection):
+        loaded.append(collection)
+        return {CRED_ID: {'public_key': 'pk', 'transports': ['internal'], 'sign_count': 3}}
+
+    monkeypatch.setattr(FirestoreClient, 'list_docs', staticmethod(list_docs))
+    monkeypatch.setattr(credential_cache, '_users', {})
+    return loaded
+
+
+def test_login_options_list_passkeys_for_authenticated_caller(client, auth_headers, passkeys):
+    response = client.post('/api/auth/webauthn/login/options', json={}, headers=auth_headers('alice'))
+    assert response.status_code == 200
+    assert [c['id'] for c in response.get_json()['allowCredentials']] == [CRED_ID]
+    assert passkeys == ['users/alice/webauthn_credentials']
+
+
+def test_login_options_for_claimed_uid_do_not_list_passkeys(client, passkeys):
+    response = client.post('/api/auth/webauthn/login/options', json={'uid': 'alice'})
+    assert response.status_code == 200
+    assert response.get_json()['allowCredentials'] == []
+    assert passkeys == []
+
+
+def test_login_options_reject_invalid_token(client, passkeys):
+    response = client.post('/api/auth/webauthn/login/options', json={},
+                           headers={'Authorization': 'Bearer not-a-token'})
+    assert response.status_code == 401